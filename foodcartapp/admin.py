@@ -1,17 +1,23 @@
 from django.conf import settings
 from django.contrib import admin
+from django.db import connection
+from django.db.models import Q
 from django.http import HttpResponseRedirect
 from django.shortcuts import reverse
 from django.templatetags.static import static
 from django.utils.html import format_html
 from django.utils.http import url_has_allowed_host_and_scheme
 
+from .candidates import refresh_order_candidates
+from .images import get_variant_url
+from .models import Banner
 from .models import Order
 from .models import OrderItem
 from .models import Product
 from .models import ProductCategory
 from .models import Restaurant
 from .models import RestaurantMenuItem
+from .search import product_search_index
 
 
 class RestaurantMenuItemInline(admin.TabularInline):
@@ -36,6 +42,7 @@ class RestaurantAdmin(admin.ModelAdmin):
         'address',
         'contact_phone',
     ]
+    readonly_fields = ('latitude', 'longitude')
     inlines = [
         RestaurantMenuItemInline
     ]
@@ -56,8 +63,6 @@ class ProductAdmin(admin.ModelAdmin):
         'category',
     ]
     search_fields = [
-        # FIXME SQLite can not convert letter case for cyrillic words properly, so search will be buggy.
-        # Migration to PostgreSQL is necessary
         'name',
         'category__name',
     ]
@@ -97,12 +102,22 @@ class ProductAdmin(admin.ModelAdmin):
             )
         }
 
+    def get_search_results(self, request, queryset, search_term):
+        # On PostgreSQL icontains is served by trigram indexes, while SQLite
+        # can not convert letter case for cyrillic words, so the in-memory
+        # index is used there
+        if not search_term or connection.vendor == 'postgresql':
+            return super().get_search_results(request, queryset, search_term)
+        product_search_index.refresh()
+        product_ids = product_search_index.search(search_term)
+        return queryset.filter(pk__in=product_ids), False
+
     def get_image_preview(self, obj):
         if not obj.image:
             return 'выберите картинку'
         return format_html(
             '<img src="{url}" style="max-height: 200px;"/>',
-            url=obj.image.url
+            url=get_variant_url(obj.image, obj.image_variants, 'card')
             )
     get_image_preview.short_description = 'превью'
 
@@ -110,9 +125,10 @@ class ProductAdmin(admin.ModelAdmin):
         if not obj.image or not obj.id:
             return 'нет картинки'
         edit_url = reverse('admin:foodcartapp_product_change', args=(obj.id,))
+        src = get_variant_url(obj.image, obj.image_variants, 'thumbnail')
         return format_html(
             '<a href="{edit_url}"><img src="{src}" style="max-height: 50px;"/></a>',
-            edit_url=edit_url, src=obj.image.url
+            edit_url=edit_url, src=src
             )
     get_image_list_preview.short_description = 'превью'
 
@@ -122,11 +138,67 @@ class ProductAdmin(admin.ModelAdmin):
     pass
 
 
+@admin.register(Banner)
+class BannerAdmin(admin.ModelAdmin):
+    list_display = [
+        'get_image_list_preview',
+        'title',
+        'position',
+        'active_from',
+        'active_until',
+    ]
+    list_display_links = [
+        'title',
+    ]
+    list_editable = [
+        'position',
+    ]
+    readonly_fields = [
+        'get_image_preview',
+    ]
+    fields = [
+        'title',
+        'text',
+        'image',
+        'get_image_preview',
+        'position',
+        'active_from',
+        'active_until',
+    ]
+
+    def get_image_preview(self, obj):
+        if not obj.image:
+            return 'выберите картинку'
+        return format_html(
+            '<img src="{url}" style="max-height: 200px;"/>',
+            url=obj.image.url
+            )
+    get_image_preview.short_description = 'превью'
+
+    def get_image_list_preview(self, obj):
+        if not obj.image:
+            return 'нет картинки'
+        return format_html(
+            '<img src="{src}" style="max-height: 50px;"/>',
+            src=obj.image.url
+            )
+    get_image_list_preview.short_description = 'превью'
+
+
 @admin.register(Order)
 class OrderAdmin(admin.ModelAdmin):
     inlines = [OrderItemInline]
 
-    readonly_fields = ('created_at',)
+    readonly_fields = ('created_at', 'total_cost', 'latitude', 'longitude')
+
+    def save_related(self, request, form, formsets, change):
+        super().save_related(request, form, formsets, change)
+        order = form.instance
+        Order.objects.filter(pk=order.pk).refresh_total_cost()
+        if order.status == Order.Status.DONE:
+            order.candidates.all().delete()
+        else:
+            refresh_order_candidates([order.pk])
 
     def response_post_save_change(self, request, obj):
         res = super().response_post_save_change(request, obj)
@@ -139,26 +211,15 @@ class OrderAdmin(admin.ModelAdmin):
             return res
 
     def formfield_for_foreignkey(self, db_field, request, **kwargs):
-        if db_field.name == "restaurant":
-            restaurant_menu_items = RestaurantMenuItem.objects.\
-                select_related('restaurant').\
-                filter(availability=True).\
-                values('restaurant_id', 'restaurant__name', 'product_id')
-            order_id = request.resolver_match.kwargs['object_id']
-            order = Order.objects.prefetch_related('items').get(pk=order_id)
-            restaurants_for_current_order = set(
-                item['restaurant_id']
-                for item in restaurant_menu_items
-                )
-            for order_item in order.items.all():
-                restauraunts_with_product = set(
-                    item['restaurant_id']
-                    for item in restaurant_menu_items
-                    if item['product_id'] == order_item.product_id
-                    )
-                restaurants_for_current_order &= restauraunts_with_product
+        order_id = request.resolver_match.kwargs.get('object_id')
+        if db_field.name == "restaurant" and order_id:
+            # Done orders have no candidates, but keep their restaurant
             kwargs["queryset"] = Restaurant.objects.\
-                filter(id__in=restaurants_for_current_order)
+                filter(
+                    Q(order_candidates__order_id=order_id)
+                    | Q(orders__id=order_id)
+                ).\
+                distinct()
         return super().formfield_for_foreignkey(db_field, request, **kwargs)
 
 
@@ -0,0 +1,59 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Min, Q
+from django.utils import timezone
+
+from .encoding import build_payload
+from .models import Banner
+from .versions import bump_version, get_version
+
+
+BANNERS_VERSION_KEY = 'banners:version'
+BANNERS_PAYLOAD_KEY = 'banners:payload:{version}'
+
+
+def bump_banners_version():
+    bump_version(BANNERS_VERSION_KEY)
+
+
+def get_next_window_change(now):
+    changes = Banner.objects.aggregate(
+        next_start=Min('active_from', filter=Q(active_from__gt=now)),
+        next_end=Min('active_until', filter=Q(active_until__gt=now)),
+    )
+    return min(filter(None, changes.values()), default=None)
+
+
+def build_banners_payload(now):
+    payload = build_payload([
+        {
+            'title': banner.title,
+            'src': banner.image.url,
+            'text': banner.text,
+        }
+        for banner in Banner.objects.active(now)
+    ])
+    expires_at = now + timezone.timedelta(
+        seconds=settings.BANNERS_CACHE_TIMEOUT
+        )
+    next_window_change = get_next_window_change(now)
+    if next_window_change:
+        expires_at = min(expires_at, next_window_change)
+    payload['expires_at'] = expires_at
+    return payload
+
+
+def get_banners_payload():
+    now = timezone.now()
+    key = BANNERS_PAYLOAD_KEY.format(version=get_version(BANNERS_VERSION_KEY))
+    payload = cache.get(key)
+    if payload is None or payload['expires_at'] <= now:
+        payload = build_banners_payload(now)
+        timeout = (payload['expires_at'] - now).total_seconds()
+        cache.set(key, payload, timeout=max(int(timeout), 1))
+    return payload
+
+
+def get_banners_max_age(payload):
+    seconds_left = (payload['expires_at'] - timezone.now()).total_seconds()
+    return max(0, min(settings.BANNERS_MAX_AGE, int(seconds_left)))
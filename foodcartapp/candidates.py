@@ -0,0 +1,62 @@
+from collections import defaultdict
+
+from django.db import transaction
+
+from .matching import RestaurantMatchingIndex
+from .models import Order, OrderCandidate, OrderItem, RestaurantMenuItem
+
+
+def get_order_products(order_ids):
+    products_by_order = defaultdict(set)
+    order_items = OrderItem.objects.\
+        filter(order_id__in=order_ids).\
+        values_list('order_id', 'product_id')
+    for order_id, product_id in order_items:
+        products_by_order[order_id].add(product_id)
+    return products_by_order
+
+
+def find_candidates(products_by_order):
+    product_ids = set().union(*products_by_order.values())
+    # Only restaurants selling at least one of the products can match
+    index = RestaurantMatchingIndex(
+        RestaurantMenuItem.objects.
+        filter(availability=True, product_id__in=product_ids).
+        values_list('restaurant_id', 'product_id')
+    )
+    return {
+        order_id: index.match(product_ids)
+        for order_id, product_ids in products_by_order.items()
+    }
+
+
+def refresh_order_candidates(order_ids):
+    order_ids = set(order_ids)
+    if not order_ids:
+        return
+    with transaction.atomic():
+        # Concurrent refreshes of the same order would insert the same
+        # rows twice, so the orders are locked, always in the same order
+        order_ids = list(
+            Order.objects.
+            select_for_update().
+            filter(pk__in=order_ids).
+            order_by('pk').
+            values_list('pk', flat=True)
+        )
+        candidates = find_candidates(get_order_products(order_ids))
+        OrderCandidate.objects.filter(order_id__in=order_ids).delete()
+        OrderCandidate.objects.bulk_create([
+            OrderCandidate(order_id=order_id, restaurant_id=restaurant_id)
+            for order_id, restaurant_ids in candidates.items()
+            for restaurant_id in restaurant_ids
+        ])
+
+
+def refresh_product_candidates(product_ids):
+    order_ids = Order.objects.\
+        exclude(status=Order.Status.DONE).\
+        filter(items__product_id__in=product_ids).\
+        values_list('id', flat=True).\
+        distinct()
+    refresh_order_candidates(order_ids)
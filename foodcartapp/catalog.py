@@ -0,0 +1,138 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
+
+from .encoding import build_payload
+from .images import get_srcset
+from .models import Product, ProductTombstone, RestaurantMenuItem
+from .versions import bump_version, get_version
+
+
+CATALOG_VERSION_KEY = 'catalog:version'
+CATALOG_SNAPSHOT_KEY = 'catalog:snapshot:{version}'
+
+
+def get_catalog_version():
+    return get_version(CATALOG_VERSION_KEY)
+
+
+def bump_catalog_version():
+    bump_version(CATALOG_VERSION_KEY)
+
+
+def serialize_product(product):
+    return {
+        'id': product.id,
+        'name': product.name,
+        'price': str(product.price),
+        'special_status': product.special_status,
+        'description': product.description,
+        'category': {
+            'id': product.category.id,
+            'name': product.category.name,
+        } if product.category else None,
+        'image': product.image.url,
+        'image_srcset': get_srcset(product.image, product.image_variants),
+        'restaurant': {
+            'id': product.id,
+            'name': product.name,
+        }
+    }
+
+
+def get_catalog_products():
+    return Product.objects.select_related('category').available()
+
+
+def iter_catalog_products(chunk_size):
+    products = get_catalog_products().iterator(chunk_size=chunk_size)
+    return (serialize_product(product) for product in products)
+
+
+def build_catalog_snapshot(version):
+    products = get_catalog_products()
+    dumped_products = [serialize_product(product) for product in products]
+    snapshot = build_payload(dumped_products)
+    snapshot['version'] = version
+    return snapshot
+
+
+def get_catalog_snapshot():
+    version = get_catalog_version()
+    key = CATALOG_SNAPSHOT_KEY.format(version=version)
+    snapshot = cache.get(key)
+    if snapshot is None:
+        snapshot = build_catalog_snapshot(version)
+        cache.set(key, snapshot, timeout=settings.CATALOG_SNAPSHOT_TIMEOUT)
+    return snapshot
+
+
+def datetime_to_version(moment):
+    return int(moment.timestamp() * 1_000_000)
+
+
+def version_to_datetime(version):
+    return datetime.fromtimestamp(version / 1_000_000, tz=dt_timezone.utc)
+
+
+def get_changes_horizon(now):
+    return now - timedelta(days=settings.CATALOG_TOMBSTONE_RETENTION_DAYS)
+
+
+def get_changed_products(since):
+    changed_menu_items = RestaurantMenuItem.objects.filter(
+        product=OuterRef('pk'),
+        updated_at__gt=since,
+    )
+    return Product.objects.select_related('category').filter(
+        Q(updated_at__gt=since)
+        | Q(category__updated_at__gt=since)
+        | Exists(changed_menu_items)
+    )
+
+
+def get_deleted_product_ids(since):
+    return set(
+        ProductTombstone.objects.
+        filter(deleted_at__gt=since).
+        values_list('product_id', flat=True)
+    )
+
+
+def get_catalog_changes(since=None):
+    now = timezone.now()
+    # Transactions that started before now may still commit rows with
+    # an earlier updated_at, so the next delta starts a bit in the past
+    version = datetime_to_version(
+        now - timedelta(seconds=settings.CATALOG_CHANGES_SAFETY_LAG)
+        )
+
+    if since is None or version_to_datetime(since) < get_changes_horizon(now):
+        return {
+            'version': version,
+            'full': True,
+            'changed': [
+                serialize_product(product)
+                for product in get_catalog_products()
+            ],
+            'removed': [],
+        }
+
+    since = version_to_datetime(since)
+    changed = []
+    removed = get_deleted_product_ids(since)
+    for product in get_changed_products(since):
+        if product.is_available:
+            changed.append(serialize_product(product))
+            removed.discard(product.id)
+        else:
+            removed.add(product.id)
+    return {
+        'version': version,
+        'full': False,
+        'changed': changed,
+        'removed': sorted(removed),
+    }
@@ -0,0 +1,65 @@
+from functools import partial
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+
+from place_coords.geocoding import geocoding_worker, get_stale_locations
+from place_coords.models import Location
+
+from .models import Order, Restaurant
+from .nearest import bump_restaurant_locations_version
+
+
+def resolve_coordinates(instances):
+    # Location is the cache of the geocoder, addresses it does not know
+    # yet are geocoded in the background and filled in when saved there
+    addresses = {instance.address for instance in instances}
+    locations = Location.objects.\
+        filter(address__in=addresses).\
+        values_list('address', 'latitude', 'longitude')
+    coords = {address: (lat, lon) for address, lat, lon in locations}
+    for instance in instances:
+        instance.latitude, instance.longitude = \
+            coords.get(instance.address, (None, None))
+        instance.coordinates_resolved = True
+    unknown_addresses = addresses - coords.keys()
+    if unknown_addresses:
+        transaction.on_commit(partial(geocoding_worker.enqueue, unknown_addresses))
+
+
+def apply_locations(locations):
+    coords = {
+        location.address: (location.latitude, location.longitude)
+        if location.correct_address else (None, None)
+        for location in locations
+    }
+    orders = list(
+        Order.objects.
+        filter(address__in=coords.keys()).
+        exclude(status=Order.Status.DONE).
+        only('address', 'latitude', 'longitude')
+    )
+    restaurants = list(
+        Restaurant.objects.
+        filter(address__in=coords.keys()).
+        only('address', 'latitude', 'longitude')
+    )
+    for instance in orders + restaurants:
+        instance.latitude, instance.longitude = coords[instance.address]
+    Order.objects.bulk_update(orders, ['latitude', 'longitude'])
+    Restaurant.objects.bulk_update(restaurants, ['latitude', 'longitude'])
+    if restaurants:
+        transaction.on_commit(bump_restaurant_locations_version)
+
+
+def get_addresses_to_refresh(now, limit):
+    # Addresses of open orders go first, the manager is waiting for them
+    open_orders = Order.objects.\
+        filter(address=OuterRef('address')).\
+        exclude(status=Order.Status.DONE)
+    return list(
+        get_stale_locations(now).
+        annotate(has_open_orders=Exists(open_orders)).
+        order_by('-has_open_orders', 'updated_at').
+        values_list('address', flat=True)[:limit]
+    )
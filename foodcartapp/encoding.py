@@ -0,0 +1,128 @@
+import gzip
+import hashlib
+import json
+
+import brotli
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+
+
+CONTENT_ENCODINGS = ['br', 'gzip']
+GZIP_LEVEL = 9
+# Higher brotli levels give almost nothing on JSON but take seconds
+# on a large catalog
+BROTLI_QUALITY = 6
+
+
+def dump_json(data):
+    # Without indent json.dumps switches to the C encoder, so the data
+    # must contain only native JSON types: Decimals are converted to str
+    # by the serializers beforehand
+    return json.dumps(
+        data,
+        ensure_ascii=False,
+        separators=(',', ':'),
+    ).encode('utf-8')
+
+
+def stream_json_array(items, batch_size=100):
+    yield b'['
+    separator = b''
+    batch = []
+    for item in items:
+        batch.append(dump_json(item))
+        if len(batch) == batch_size:
+            yield separator + b','.join(batch)
+            separator = b','
+            batch = []
+    if batch:
+        yield separator + b','.join(batch)
+    yield b']'
+
+
+def dump_pretty_json(data):
+    return json.dumps(data, ensure_ascii=False, indent=4).encode('utf-8')
+
+
+def compress_gzip(body):
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def compress_brotli(body):
+    return brotli.compress(body, mode=brotli.MODE_TEXT, quality=BROTLI_QUALITY)
+
+
+def build_payload(data):
+    body = dump_json(data)
+    return {
+        'etag': hashlib.sha1(body).hexdigest(),
+        'bodies': {
+            'identity': body,
+            'gzip': compress_gzip(body),
+            'br': compress_brotli(body),
+        },
+    }
+
+
+def parse_accept_encoding(header):
+    accepted = {}
+    for part in header.split(','):
+        coding, _, params = part.partition(';')
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        params = params.strip().replace(' ', '')
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding] = quality
+    return accepted
+
+
+def choose_content_encoding(request):
+    accepted = parse_accept_encoding(
+        request.META.get('HTTP_ACCEPT_ENCODING', '')
+        )
+    for coding in CONTENT_ENCODINGS:
+        if accepted.get(coding, accepted.get('*', 0)) > 0:
+            return coding
+    return 'identity'
+
+
+def is_not_modified(request, etag):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if not if_none_match:
+        return False
+    return if_none_match.strip() == '*' or etag in parse_etags(if_none_match)
+
+
+def payload_response(request, payload):
+    if 'pretty' in request.GET:
+        data = json.loads(payload['bodies']['identity'])
+        return HttpResponse(
+            dump_pretty_json(data),
+            content_type='application/json'
+            )
+
+    coding = choose_content_encoding(request)
+    if coding == 'identity':
+        etag = f'"{payload["etag"]}"'
+    else:
+        etag = f'"{payload["etag"]}-{coding}"'
+
+    if is_not_modified(request, etag):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(
+            payload['bodies'][coding],
+            content_type='application/json'
+            )
+        if coding != 'identity':
+            response['Content-Encoding'] = coding
+    response['ETag'] = etag
+    patch_vary_headers(response, ['Accept-Encoding'])
+    return response
@@ -0,0 +1,83 @@
+import hashlib
+import json
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+
+
+IDEMPOTENCY_CACHE_KEY = 'idempotency:{scope}:{key}'
+PENDING = 'pending'
+DONE = 'done'
+POLL_INTERVAL = 0.05
+
+
+def get_fingerprint(data):
+    dumped = json.dumps(data, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(dumped.encode('utf-8')).hexdigest()
+
+
+def get_idempotency_cache_key(scope, idempotency_key):
+    # Client keys may be long or contain characters memcached rejects
+    return IDEMPOTENCY_CACHE_KEY.format(
+        scope=scope,
+        key=hashlib.sha256(idempotency_key.encode('utf-8')).hexdigest(),
+    )
+
+
+def run_idempotent(scope, idempotency_key, data, handler):
+    cache_key = get_idempotency_cache_key(scope, idempotency_key)
+    fingerprint = get_fingerprint(data)
+    deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_TIMEOUT
+    while True:
+        claimed = cache.add(
+            cache_key,
+            {'state': PENDING, 'fingerprint': fingerprint},
+            timeout=settings.IDEMPOTENCY_LOCK_TIMEOUT,
+        )
+        if claimed:
+            return run_claimed(cache_key, fingerprint, handler)
+
+        entry = cache.get(cache_key)
+        if entry is None:
+            # The first request failed or its lock expired, try to claim again
+            continue
+        if entry['fingerprint'] != fingerprint:
+            return Response(
+                {'detail': 'Idempotency-Key уже использован с другими данными.'},
+                status=status.HTTP_422_UNPROCESSABLE_ENTITY
+                )
+        if entry['state'] == DONE:
+            response = Response(entry['data'], status=entry['status'])
+            response['Idempotent-Replayed'] = 'true'
+            return response
+        if time.monotonic() > deadline:
+            return Response(
+                {'detail': 'Запрос с этим Idempotency-Key ещё выполняется.'},
+                status=status.HTTP_409_CONFLICT
+                )
+        time.sleep(POLL_INTERVAL)
+
+
+def run_claimed(cache_key, fingerprint, handler):
+    try:
+        response = handler()
+    except BaseException:
+        cache.delete(cache_key)
+        raise
+    if status.is_success(response.status_code):
+        cache.set(
+            cache_key,
+            {
+                'state': DONE,
+                'fingerprint': fingerprint,
+                'status': response.status_code,
+                'data': response.data,
+            },
+            timeout=settings.IDEMPOTENCY_KEY_TTL,
+        )
+    else:
+        cache.delete(cache_key)
+    return response
@@ -0,0 +1,88 @@
+import hashlib
+import os
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, features
+
+
+VARIANT_SIZES = {
+    'thumbnail': 100,
+    'card': 400,
+    'full': 1200,
+}
+VARIANT_FORMATS = {
+    'jpeg': ('JPEG', 'jpg', {'quality': 85, 'optimize': True, 'progressive': True}),
+    'webp': ('WEBP', 'webp', {'quality': 80, 'method': 6}),
+}
+
+
+def get_variant_formats():
+    if features.check('webp'):
+        return VARIANT_FORMATS
+    return {'jpeg': VARIANT_FORMATS['jpeg']}
+
+
+def get_variant_name(original_name, digest, variant, extension):
+    stem = os.path.splitext(original_name)[0]
+    return f'{stem}.{digest}.{variant}.{extension}'
+
+
+def flatten(image):
+    if image.mode in ('RGBA', 'LA', 'P'):
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def build_image_variants(storage, name):
+    with storage.open(name, 'rb') as original:
+        content = original.read()
+    digest = hashlib.sha1(content).hexdigest()[:12]
+    image = ImageOps.exif_transpose(Image.open(BytesIO(content)))
+
+    variants = {}
+    for variant, size in VARIANT_SIZES.items():
+        resized = image.copy()
+        resized.thumbnail((size, size), Image.LANCZOS)
+        variants[variant] = {
+            'width': resized.width,
+            'height': resized.height,
+        }
+        for image_format, (pil_format, extension, options) in get_variant_formats().items():
+            variant_name = get_variant_name(name, digest, variant, extension)
+            if not storage.exists(variant_name):
+                buffer = BytesIO()
+                converted = resized if pil_format == 'WEBP' else flatten(resized)
+                converted.save(buffer, pil_format, **options)
+                storage.save(variant_name, ContentFile(buffer.getvalue()))
+            variants[variant][image_format] = variant_name
+    return {
+        'source': name,
+        'digest': digest,
+        'variants': variants,
+    }
+
+
+def get_srcset(image_field, image_variants):
+    srcset = {}
+    for variant in image_variants.get('variants', {}).values():
+        for image_format in VARIANT_FORMATS:
+            if image_format not in variant:
+                continue
+            url = image_field.storage.url(variant[image_format])
+            srcset.setdefault(image_format, []).append(f'{url} {variant["width"]}w')
+    return {
+        image_format: ', '.join(sources)
+        for image_format, sources in srcset.items()
+    }
+
+
+def get_variant_url(image_field, image_variants, variant, image_format='jpeg'):
+    try:
+        name = image_variants['variants'][variant][image_format]
+    except KeyError:
+        return image_field.url
+    return image_field.storage.url(name)
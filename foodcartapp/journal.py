@@ -0,0 +1,172 @@
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import Order, Product
+from .orders import collect_product_ids, create_orders
+from .serializers import OrderSerializer
+
+
+PENDING = 'pending'
+DONE = 'done'
+FAILED = 'failed'
+
+
+class OrderJournal:
+    def __init__(self, path):
+        self.path = path
+        self.local = threading.local()
+
+    @property
+    def connection(self):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(
+                self.path,
+                timeout=30,
+                isolation_level=None,
+                )
+            connection.row_factory = sqlite3.Row
+            connection.execute('PRAGMA journal_mode=WAL')
+            # The client gets its ticket only after the entry is on disk
+            connection.execute('PRAGMA synchronous=FULL')
+            connection.execute('''
+                CREATE TABLE IF NOT EXISTS entries (
+                    ticket TEXT PRIMARY KEY,
+                    payload TEXT NOT NULL,
+                    status TEXT NOT NULL,
+                    order_id INTEGER,
+                    errors TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+            ''')
+            connection.execute('''
+                CREATE INDEX IF NOT EXISTS entries_status_created_at
+                ON entries (status, created_at)
+            ''')
+            self.local.connection = connection
+        return connection
+
+    @contextmanager
+    def transaction(self):
+        self.connection.execute('BEGIN IMMEDIATE')
+        try:
+            yield self.connection
+        except BaseException:
+            self.connection.execute('ROLLBACK')
+            raise
+        self.connection.execute('COMMIT')
+
+    def append(self, payload):
+        ticket = uuid.uuid4().hex
+        now = time.time()
+        self.connection.execute(
+            'INSERT INTO entries (ticket, payload, status, created_at, updated_at) '
+            'VALUES (?, ?, ?, ?, ?)',
+            (ticket, json.dumps(payload, ensure_ascii=False), PENDING, now, now),
+        )
+        return ticket
+
+    def get(self, ticket):
+        row = self.connection.execute(
+            'SELECT ticket, status, order_id, errors FROM entries WHERE ticket = ?',
+            (ticket,),
+        ).fetchone()
+        if row is None:
+            return None
+        return {
+            'ticket': row['ticket'],
+            'status': row['status'],
+            'order_id': row['order_id'],
+            'errors': json.loads(row['errors']) if row['errors'] else None,
+        }
+
+    def fetch_pending(self, limit):
+        rows = self.connection.execute(
+            'SELECT ticket, payload FROM entries WHERE status = ? '
+            'ORDER BY created_at LIMIT ?',
+            (PENDING, limit),
+        )
+        return [(row['ticket'], json.loads(row['payload'])) for row in rows]
+
+    def mark_done(self, order_ids):
+        now = time.time()
+        with self.transaction() as connection:
+            connection.executemany(
+                'UPDATE entries SET status = ?, order_id = ?, updated_at = ? '
+                'WHERE ticket = ?',
+                [(DONE, order_id, now, ticket) for ticket, order_id in order_ids.items()],
+            )
+
+    def mark_failed(self, errors):
+        now = time.time()
+        with self.transaction() as connection:
+            connection.executemany(
+                'UPDATE entries SET status = ?, errors = ?, updated_at = ? '
+                'WHERE ticket = ?',
+                [
+                    (FAILED, json.dumps(ticket_errors, ensure_ascii=False), now, ticket)
+                    for ticket, ticket_errors in errors.items()
+                ],
+            )
+
+    def purge(self, older_than):
+        with self.transaction() as connection:
+            return connection.execute(
+                'DELETE FROM entries WHERE status != ? AND updated_at < ?',
+                (PENDING, older_than),
+            ).rowcount
+
+
+@lru_cache(maxsize=None)
+def open_order_journal(path):
+    return OrderJournal(path)
+
+
+def get_order_journal():
+    return open_order_journal(settings.ORDER_JOURNAL_PATH)
+
+
+def drain_order_journal(journal, batch_size):
+    entries = journal.fetch_pending(batch_size)
+    if not entries:
+        return 0
+
+    # Orders committed before a crash are found by ticket and only
+    # marked as done, so replaying the journal never duplicates them
+    order_ids = dict(
+        Order.objects.
+        filter(ticket__in=[ticket for ticket, _ in entries]).
+        values_list('ticket', 'id')
+    )
+    products = Product.objects.in_bulk(
+        collect_product_ids(payload for _, payload in entries)
+        )
+    orders_data = []
+    errors = {}
+    for ticket, payload in entries:
+        if ticket in order_ids:
+            continue
+        serializer = OrderSerializer(
+            data=payload,
+            context={'products': products}
+            )
+        if serializer.is_valid():
+            orders_data.append(dict(serializer.validated_data, ticket=ticket))
+        else:
+            errors[ticket] = serializer.errors
+
+    with transaction.atomic():
+        orders = create_orders(orders_data)
+    order_ids.update((order.ticket, order.id) for order in orders)
+    journal.mark_done(order_ids)
+    journal.mark_failed(errors)
+    return len(entries)
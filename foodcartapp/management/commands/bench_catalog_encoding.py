@@ -0,0 +1,70 @@
+import json
+import timeit
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+
+from foodcartapp.encoding import compress_brotli, compress_gzip, dump_json
+
+
+def make_products(count):
+    return [
+        {
+            'id': product_id,
+            'name': f'Бургер №{product_id}',
+            'price': Decimal('249.00') + product_id % 100,
+            'special_status': product_id % 7 == 0,
+            'description': 'Сочная котлета из 100% говядины, сыр, свежие '
+                           'овощи и фирменный соус на воздушной булочке',
+            'category': {
+                'id': product_id % 20,
+                'name': f'Категория {product_id % 20}',
+            },
+            'image': f'/media/product_{product_id}.jpg',
+            'restaurant': {
+                'id': product_id,
+                'name': f'Бургер №{product_id}',
+            }
+        }
+        for product_id in range(1, count + 1)
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает размер и время кодирования каталога товаров'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=5000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def measure(self, name, func, repeat):
+        body = func()
+        seconds = min(timeit.repeat(func, number=1, repeat=repeat))
+        self.stdout.write(
+            f'{name:<28}{len(body):>12} байт{seconds * 1000:>12.1f} мс'
+        )
+
+    def handle(self, *args, **options):
+        products = make_products(options['products'])
+        native_products = [
+            dict(product, price=str(product['price']))
+            for product in products
+        ]
+        repeat = options['repeat']
+        body = dump_json(native_products)
+
+        self.stdout.write(f'Товаров: {len(products)}')
+        self.measure(
+            'JsonResponse, indent=4',
+            lambda: json.dumps(
+                products,
+                cls=DjangoJSONEncoder,
+                ensure_ascii=False,
+                indent=4,
+            ).encode('utf-8'),
+            repeat,
+        )
+        self.measure('compact', lambda: dump_json(native_products), repeat)
+        self.measure('compact, gzip', lambda: compress_gzip(body), repeat)
+        self.measure('compact, brotli', lambda: compress_brotli(body), repeat)
@@ -0,0 +1,76 @@
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from foodcartapp.catalog import build_catalog_snapshot, iter_catalog_products
+from foodcartapp.encoding import stream_json_array
+from foodcartapp.models import Product, ProductCategory
+
+
+def measure_peak(func):
+    tracemalloc.start()
+    try:
+        size = func()
+        return size, tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def build_snapshot():
+    return len(build_catalog_snapshot(version=0)['bodies']['identity'])
+
+
+def stream_catalog(chunk_size):
+    def consume():
+        products = iter_catalog_products(chunk_size)
+        return sum(len(chunk) for chunk in stream_json_array(products))
+    return consume
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает пиковую память при сборке каталога целиком и потоком'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--products',
+            type=int,
+            nargs='+',
+            default=[1000, 5000, 20000],
+        )
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def create_products(self, count):
+        category = ProductCategory.objects.create(name='Бургеры')
+        Product.objects.bulk_create(
+            [
+                Product(
+                    name=f'Бургер №{product_id}',
+                    category=category,
+                    price=249,
+                    image=f'product_{product_id}.jpg',
+                    description='Сочная котлета из 100% говядины, сыр, '
+                                'свежие овощи и фирменный соус',
+                    is_available=True,
+                )
+                for product_id in range(count)
+            ],
+            batch_size=1000,
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f'{"товаров":>10}{"байт":>12}{"целиком, КБ":>16}{"потоком, КБ":>16}'
+        )
+        for count in options['products']:
+            with transaction.atomic():
+                self.create_products(count)
+                size, snapshot_peak = measure_peak(build_snapshot)
+                _, stream_peak = measure_peak(
+                    stream_catalog(options['chunk_size'])
+                    )
+                transaction.set_rollback(True)
+            self.stdout.write(
+                f'{count:>10}{size:>12}'
+                f'{snapshot_peak // 1024:>16}{stream_peak // 1024:>16}'
+            )
@@ -0,0 +1,71 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.test import APIRequestFactory
+
+from foodcartapp.models import Product
+from foodcartapp.views import register_order, register_orders_bulk
+
+
+def make_order(index, product_ids):
+    return {
+        'products': [
+            {'product': product_ids[(index + shift) % len(product_ids)], 'quantity': 2}
+            for shift in range(3)
+        ],
+        'firstname': 'Иван',
+        'lastname': 'Петров',
+        'phonenumber': '+79291000000',
+        'address': f'Москва, ул. Тверская, {index}',
+    }
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает скорость приёма заказов по одному и пачкой'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-sizes',
+            type=int,
+            nargs='+',
+            default=[100, 1000],
+        )
+
+    def measure(self, func):
+        with transaction.atomic():
+            started_at = time.perf_counter()
+            func()
+            elapsed = time.perf_counter() - started_at
+            transaction.set_rollback(True)
+        return elapsed
+
+    def handle(self, *args, **options):
+        product_ids = list(Product.objects.values_list('id', flat=True)[:50])
+        if not product_ids:
+            self.stderr.write('Нужен хотя бы один товар в базе')
+            return
+        factory = APIRequestFactory()
+
+        self.stdout.write(
+            f'{"заказов":>10}{"по одному, заказ/с":>22}{"пачкой, заказ/с":>20}'
+        )
+        for batch_size in options['batch_sizes']:
+            orders = [make_order(index, product_ids) for index in range(batch_size)]
+
+            def post_one_by_one():
+                for order in orders:
+                    request = factory.post('/api/order/', order, format='json')
+                    assert register_order(request).status_code == 201
+
+            def post_batch():
+                request = factory.post('/api/orders/bulk/', orders, format='json')
+                assert register_orders_bulk(request).status_code == 200
+
+            single_elapsed = self.measure(post_one_by_one)
+            bulk_elapsed = self.measure(post_batch)
+            self.stdout.write(
+                f'{batch_size:>10}'
+                f'{batch_size / single_elapsed:>22.0f}'
+                f'{batch_size / bulk_elapsed:>20.0f}'
+            )
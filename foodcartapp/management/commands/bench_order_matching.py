@@ -0,0 +1,57 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from foodcartapp.matching import RestaurantMatchingIndex
+from foodcartapp.matching import find_restaurants_by_scan
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает подбор ресторанов для заказов перебором меню и по индексу'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--restaurants', type=int, default=500)
+        parser.add_argument('--products', type=int, default=5000)
+        parser.add_argument('--orders', type=int, default=2000)
+        parser.add_argument('--menu-share', type=float, default=0.3)
+        parser.add_argument(
+            '--scan-sample',
+            type=int,
+            default=5,
+            help='на скольких заказах замерять перебор, он очень медленный',
+        )
+
+    def handle(self, *args, **options):
+        generator = random.Random(0)
+        product_ids = range(1, options['products'] + 1)
+        menu_items = [
+            (restaurant_id, product_id)
+            for restaurant_id in range(1, options['restaurants'] + 1)
+            for product_id in product_ids
+            if generator.random() < options['menu_share']
+        ]
+        orders = [
+            generator.sample(product_ids, generator.randint(1, 5))
+            for _ in range(options['orders'])
+        ]
+        self.stdout.write(f'Позиций меню: {len(menu_items)}')
+
+        started_at = time.perf_counter()
+        index = RestaurantMatchingIndex(menu_items)
+        build_elapsed = time.perf_counter() - started_at
+        started_at = time.perf_counter()
+        matches = [index.match(order) for order in orders]
+        match_elapsed = time.perf_counter() - started_at
+
+        sample = orders[:options['scan_sample']]
+        started_at = time.perf_counter()
+        for order, restaurants in zip(sample, matches):
+            assert find_restaurants_by_scan(order, menu_items) == set(restaurants)
+        scan_elapsed = time.perf_counter() - started_at
+        scan_total = scan_elapsed / len(sample) * len(orders)
+
+        self.stdout.write(f'Индекс: сборка {build_elapsed:.2f} с, '
+                          f'подбор для всех заказов {match_elapsed:.3f} с')
+        self.stdout.write(f'Перебор: {scan_elapsed:.2f} с на {len(sample)} '
+                          f'заказов, для всех заказов ~{scan_total:.0f} с')
@@ -0,0 +1,83 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import override_settings
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APIRequestFactory
+
+from foodcartapp.management.commands.bench_order_intake import make_order
+from foodcartapp.models import Product
+from foodcartapp.serializers import OrderSerializer
+from foodcartapp.validation import validate_order
+from foodcartapp.views import register_order
+
+
+def validate_with_serializer(order, products):
+    serializer = OrderSerializer(data=order, context={'products': products})
+    serializer.is_valid()
+
+
+def validate_fast(order, products):
+    try:
+        validate_order(order, products)
+    except ValidationError:
+        pass
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает скорость проверки заказов OrderSerializer и быстрой проверкой'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=1000)
+
+    def make_orders(self, count, product_ids):
+        orders = [make_order(index, product_ids) for index in range(count)]
+        # Every tenth order is invalid, so that error reporting is measured too
+        for order in orders[::10]:
+            order['phonenumber'] = '+70000000000'
+            order['products'].append({'product': 'x', 'quantity': 0})
+        return orders
+
+    def measure_validation(self, validate, orders, products):
+        started_at = time.perf_counter()
+        for order in orders:
+            validate(order, products)
+        return len(orders) / (time.perf_counter() - started_at)
+
+    def measure_requests(self, orders, fast):
+        factory = APIRequestFactory()
+        requests = [
+            factory.post('/api/order/', order, format='json')
+            for order in orders
+        ]
+        with override_settings(ORDER_FAST_VALIDATION=fast), transaction.atomic():
+            started_at = time.perf_counter()
+            for request in requests:
+                register_order(request)
+            elapsed = time.perf_counter() - started_at
+            transaction.set_rollback(True)
+        return len(orders) / elapsed
+
+    def handle(self, *args, **options):
+        product_ids = list(Product.objects.values_list('id', flat=True)[:50])
+        if not product_ids:
+            self.stderr.write('Нужен хотя бы один товар в базе')
+            return
+        products = Product.objects.in_bulk(product_ids)
+        orders = self.make_orders(options['orders'], product_ids)
+
+        serializer_rate = self.measure_validation(
+            validate_with_serializer, orders, products)
+        fast_rate = self.measure_validation(validate_fast, orders, products)
+        serializer_requests_rate = self.measure_requests(orders, fast=False)
+        fast_requests_rate = self.measure_requests(orders, fast=True)
+
+        self.stdout.write(f'{"":<24}{"OrderSerializer":>18}{"быстрая":>12}')
+        self.stdout.write(
+            f'{"проверка, заказ/с":<24}{serializer_rate:>18.0f}{fast_rate:>12.0f}'
+        )
+        self.stdout.write(
+            f'{"запрос, заказ/с":<24}'
+            f'{serializer_requests_rate:>18.0f}{fast_requests_rate:>12.0f}'
+        )
@@ -0,0 +1,73 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.utils import timezone
+
+from foodcartapp.catalog import bump_catalog_version
+from foodcartapp.images import build_image_variants
+from foodcartapp.models import Product
+
+
+def build_variants(name):
+    try:
+        return name, build_image_variants(default_storage, name), None
+    except OSError as error:
+        return name, None, str(error)
+
+
+class Command(BaseCommand):
+    help = 'Создаёт уменьшенные копии картинок товаров'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='пересоздать копии и для уже обработанных картинок',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=None,
+            help='число процессов, по умолчанию по числу ядер',
+        )
+
+    def handle(self, *args, **options):
+        products = Product.objects.\
+            exclude(image='').\
+            only('image', 'image_variants', 'updated_at')
+        products_by_image = {}
+        for product in products:
+            if options['force'] or \
+                    product.image_variants.get('source') != product.image.name:
+                products_by_image.setdefault(product.image.name, []).append(product)
+        if not products_by_image:
+            self.stdout.write('Все картинки уже обработаны')
+            return
+
+        # Forked workers must not share the parent's database connections
+        connections.close_all()
+        changed_products = []
+        with ProcessPoolExecutor(
+                max_workers=options['workers'],
+                initializer=django.setup) as executor:
+            for name, image_variants, error in executor.map(
+                    build_variants, products_by_image):
+                if error:
+                    self.stderr.write(f'{name}: {error}')
+                    continue
+                for product in products_by_image[name]:
+                    product.image_variants = image_variants
+                    # The changes feed must report the new image_srcset
+                    product.updated_at = timezone.now()
+                    changed_products.append(product)
+
+        Product.objects.bulk_update(
+            changed_products,
+            ['image_variants', 'updated_at'],
+            batch_size=500
+            )
+        bump_catalog_version()
+        self.stdout.write(f'Обработано товаров: {len(changed_products)}')
@@ -0,0 +1,38 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from foodcartapp.journal import drain_order_journal, get_order_journal
+
+
+class Command(BaseCommand):
+    help = 'Переносит принятые заказы из журнала в базу данных'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200)
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=0.5,
+            help='пауза в секундах, когда журнал пуст',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='разобрать накопившиеся заказы и выйти',
+        )
+
+    def handle(self, *args, **options):
+        journal = get_order_journal()
+        retention = settings.ORDER_JOURNAL_RETENTION_DAYS * 24 * 60 * 60
+        while True:
+            drained = drain_order_journal(journal, options['batch_size'])
+            if drained:
+                self.stdout.write(f'Обработано заявок: {drained}')
+            if drained == options['batch_size']:
+                continue
+            journal.purge(time.time() - retention)
+            if options['once']:
+                return
+            time.sleep(options['interval'])
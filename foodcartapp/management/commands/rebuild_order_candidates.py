@@ -0,0 +1,77 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+
+from foodcartapp.candidates import refresh_order_candidates
+from foodcartapp.matching import find_restaurants_by_scan
+from foodcartapp.models import Order, OrderCandidate, OrderItem
+from foodcartapp.models import RestaurantMenuItem
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает рестораны, которые могут выполнить заказы, и проверяет их'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='только проверить, ничего не меняя',
+        )
+
+    def find_mismatches(self):
+        open_orders = Order.objects.exclude(status=Order.Status.DONE)
+        products_by_order = {
+            order_id: set()
+            for order_id in open_orders.values_list('id', flat=True)
+        }
+        order_items = OrderItem.objects.\
+            filter(order__in=open_orders).\
+            values_list('order_id', 'product_id')
+        for order_id, product_id in order_items:
+            products_by_order[order_id].add(product_id)
+
+        stored_candidates = {order_id: set() for order_id in products_by_order}
+        candidates = OrderCandidate.objects.values_list('order_id', 'restaurant_id')
+        for order_id, restaurant_id in candidates:
+            # Candidates of done orders are mismatches too
+            stored_candidates.setdefault(order_id, set()).add(restaurant_id)
+
+        # Checked by the plain scan view_orders used before the index, so
+        # that a bug in the index shows up as a mismatch
+        menu_items_by_product = defaultdict(list)
+        menu_items = RestaurantMenuItem.objects.\
+            filter(availability=True).\
+            values_list('restaurant_id', 'product_id')
+        for restaurant_id, product_id in menu_items:
+            menu_items_by_product[product_id].append((restaurant_id, product_id))
+        mismatches = []
+        for order_id, restaurant_ids in stored_candidates.items():
+            product_ids = products_by_order.get(order_id)
+            actual_ids = set()
+            if product_ids:
+                # Only the menu items of the order's products can matter
+                actual_ids = find_restaurants_by_scan(product_ids, [
+                    menu_item
+                    for product_id in product_ids
+                    for menu_item in menu_items_by_product[product_id]
+                ])
+            if restaurant_ids != actual_ids:
+                mismatches.append((order_id, restaurant_ids, actual_ids))
+        return mismatches
+
+    def handle(self, *args, **options):
+        if not options['verify']:
+            open_orders = Order.objects.exclude(status=Order.Status.DONE)
+            OrderCandidate.objects.exclude(order__in=open_orders).delete()
+            refresh_order_candidates(open_orders.values_list('id', flat=True))
+            self.stdout.write(f'Пересчитано заказов: {open_orders.count()}')
+
+        mismatches = self.find_mismatches()
+        for order_id, restaurant_ids, actual_ids in mismatches:
+            self.stderr.write(
+                f'Заказ {order_id}: сохранено {sorted(restaurant_ids)}, '
+                f'на самом деле {sorted(actual_ids)}'
+            )
+        if mismatches:
+            raise CommandError(f'Расхождений: {len(mismatches)}')
+        self.stdout.write('Рестораны для заказов совпадают с меню')
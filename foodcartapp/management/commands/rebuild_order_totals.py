@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import DecimalField, F, Sum, Value
+from django.db.models.functions import Coalesce
+
+from foodcartapp.models import Order
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает стоимость заказов и проверяет её'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='только проверить, ничего не меняя',
+        )
+
+    def find_mismatches(self):
+        orders = Order.objects.annotate(
+            actual_cost=Coalesce(
+                Sum(F('items__quantity') * F('items__price')),
+                Value(0),
+                output_field=DecimalField()
+                )
+        ).values_list('id', 'total_cost', 'actual_cost')
+        return [order for order in orders if order[1] != order[2]]
+
+    def handle(self, *args, **options):
+        if not options['verify']:
+            updated = Order.objects.refresh_total_cost()
+            self.stdout.write(f'Пересчитано заказов: {updated}')
+
+        mismatches = self.find_mismatches()
+        for order_id, total_cost, actual_cost in mismatches:
+            self.stderr.write(
+                f'Заказ {order_id}: сохранено {total_cost}, '
+                f'на самом деле {actual_cost}'
+            )
+        if mismatches:
+            raise CommandError(f'Расхождений: {len(mismatches)}')
+        self.stdout.write('Стоимость заказов совпадает с позициями')
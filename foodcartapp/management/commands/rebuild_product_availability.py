@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from foodcartapp.catalog import bump_catalog_version
+from foodcartapp.models import Product
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает наличие товаров в ресторанах и проверяет его'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='только проверить, ничего не меняя',
+        )
+
+    def find_mismatches(self):
+        products = Product.objects.annotate(
+            actual_count=Count(
+                'menu_items',
+                filter=Q(menu_items__availability=True)
+                )
+        ).values_list(
+            'id',
+            'name',
+            'available_restaurants_count',
+            'is_available',
+            'actual_count',
+        )
+        return [
+            product for product in products
+            if product[2] != product[4] or product[3] != bool(product[4])
+        ]
+
+    def handle(self, *args, **options):
+        if not options['verify']:
+            # Only the corrected products are touched, so that the changes
+            # feed reports them and nothing else
+            product_ids = [product[0] for product in self.find_mismatches()]
+            with transaction.atomic():
+                products = Product.objects.filter(pk__in=product_ids)
+                updated = products.refresh_availability()
+                products.update(updated_at=timezone.now())
+            bump_catalog_version()
+            self.stdout.write(f'Исправлено товаров: {updated}')
+
+        mismatches = self.find_mismatches()
+        for product_id, name, count, is_available, actual_count in mismatches:
+            self.stderr.write(
+                f'{product_id} {name}: сохранено {count} ({is_available}), '
+                f'на самом деле {actual_count}'
+            )
+        if mismatches:
+            raise CommandError(f'Расхождений: {len(mismatches)}')
+        self.stdout.write('Наличие товаров совпадает с меню ресторанов')
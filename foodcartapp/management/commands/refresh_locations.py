@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from foodcartapp.coordinates import get_addresses_to_refresh
+from place_coords.geocoding import GeocodingWorker
+
+
+class Command(BaseCommand):
+    help = 'Заново геокодирует устаревшие адреса, начиная с адресов открытых заказов'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=1000,
+            help='сколько адресов обновить за запуск',
+        )
+
+    def handle(self, *args, **options):
+        if not settings.YANDEX_GEO_API_KEY:
+            raise CommandError('Не задан YANDEX_GEO_API_KEY')
+        addresses = get_addresses_to_refresh(timezone.now(), options['limit'])
+        # Requests are spaced by GEOCODER_RATE_LIMIT, and every batch is
+        # saved at once, so an interrupted run keeps what it has found
+        worker = GeocodingWorker()
+        refreshed = 0
+        batch_size = settings.GEOCODER_BATCH_SIZE
+        for start in range(0, len(addresses), batch_size):
+            refreshed += len(worker.refresh(addresses[start:start + batch_size]))
+        self.stdout.write(f'Обновлено адресов: {refreshed} из {len(addresses)}')
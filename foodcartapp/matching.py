@@ -0,0 +1,57 @@
+from .models import RestaurantMenuItem
+
+
+def iter_bits(mask):
+    while mask:
+        lowest_bit = mask & -mask
+        yield lowest_bit.bit_length() - 1
+        mask ^= lowest_bit
+
+
+def find_restaurants_by_scan(product_ids, menu_items):
+    # The algorithm view_orders used before the index, kept to check it
+    restaurants = set(restaurant_id for restaurant_id, _ in menu_items)
+    for product_id in product_ids:
+        restaurants &= set(
+            restaurant_id
+            for restaurant_id, menu_product_id in menu_items
+            if menu_product_id == product_id
+        )
+    return restaurants
+
+
+class RestaurantMatchingIndex:
+    def __init__(self, menu_items):
+        # Restaurant ids may be sparse, so bits are numbered by position
+        menu_items = list(menu_items)
+        self.restaurant_ids = sorted({
+            restaurant_id for restaurant_id, _ in menu_items
+        })
+        positions = {
+            restaurant_id: position
+            for position, restaurant_id in enumerate(self.restaurant_ids)
+        }
+        self.all_restaurants = (1 << len(self.restaurant_ids)) - 1
+        self.restaurants_by_product = {}
+        for restaurant_id, product_id in menu_items:
+            self.restaurants_by_product[product_id] = \
+                self.restaurants_by_product.get(product_id, 0) | \
+                1 << positions[restaurant_id]
+
+    def match(self, product_ids):
+        mask = self.all_restaurants
+        for product_id in product_ids:
+            mask &= self.restaurants_by_product.get(product_id, 0)
+            if not mask:
+                return []
+        return [self.restaurant_ids[position] for position in iter_bits(mask)]
+
+
+def build_matching_index():
+    return RestaurantMatchingIndex(
+        RestaurantMenuItem.objects.
+        filter(availability=True).
+        values_list('restaurant_id', 'product_id').
+        iterator()
+    )
+
@@ -0,0 +1,39 @@
+from django.db import migrations
+
+
+# Django runs icontains on PostgreSQL as UPPER(column::text) LIKE UPPER(%s),
+# so the trigram indexes are built over the same expression
+CREATE_INDEXES = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX IF NOT EXISTS foodcartapp_product_name_trgm '
+    'ON foodcartapp_product USING gin (UPPER(name::text) gin_trgm_ops)',
+    'CREATE INDEX IF NOT EXISTS foodcartapp_productcategory_name_trgm '
+    'ON foodcartapp_productcategory USING gin (UPPER(name::text) gin_trgm_ops)',
+]
+DROP_INDEXES = [
+    'DROP INDEX IF EXISTS foodcartapp_product_name_trgm',
+    'DROP INDEX IF EXISTS foodcartapp_productcategory_name_trgm',
+]
+
+
+def run_on_postgresql(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0054_catalog_changes'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_on_postgresql(CREATE_INDEXES),
+            run_on_postgresql(DROP_INDEXES),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.15 on 2026-10-18 03:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0055_product_search_trigram_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='ticket',
+            field=models.CharField(blank=True, editable=False, max_length=32, null=True, unique=True, verbose_name='номер заявки'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 3.2.15 on 2026-10-18 03:49
+
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+
+def fill_total_cost(apps, schema_editor):
+    Order = apps.get_model('foodcartapp', 'Order')
+    OrderItem = apps.get_model('foodcartapp', 'OrderItem')
+    items_cost = (
+        OrderItem.objects
+        .filter(order=OuterRef('pk'))
+        .order_by()
+        .values('order')
+        .annotate(total_cost=Sum(F('quantity') * F('price')))
+        .values('total_cost')
+    )
+    Order.objects.update(
+        total_cost=Coalesce(
+            Subquery(items_cost),
+            0,
+            output_field=models.DecimalField()
+            ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0056_order_ticket'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='total_cost',
+            field=models.DecimalField(db_index=True, decimal_places=2, default=0, editable=False, max_digits=10, verbose_name='стоимость заказа'),
+        ),
+        migrations.RunPython(fill_total_cost, migrations.RunPython.noop),
+    ]
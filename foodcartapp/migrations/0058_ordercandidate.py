@@ -0,0 +1,64 @@
+# Generated by Django 3.2.15 on 2026-10-18 03:55
+
+from collections import defaultdict
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+DONE = 4
+
+
+def fill_candidates(apps, schema_editor):
+    OrderItem = apps.get_model('foodcartapp', 'OrderItem')
+    OrderCandidate = apps.get_model('foodcartapp', 'OrderCandidate')
+    RestaurantMenuItem = apps.get_model('foodcartapp', 'RestaurantMenuItem')
+
+    restaurants_by_product = defaultdict(set)
+    menu_items = RestaurantMenuItem.objects.\
+        filter(availability=True).\
+        values_list('restaurant_id', 'product_id')
+    for restaurant_id, product_id in menu_items:
+        restaurants_by_product[product_id].add(restaurant_id)
+
+    products_by_order = defaultdict(set)
+    order_items = OrderItem.objects.\
+        exclude(order__status=DONE).\
+        values_list('order_id', 'product_id')
+    for order_id, product_id in order_items:
+        products_by_order[order_id].add(product_id)
+
+    candidates = []
+    for order_id, product_ids in products_by_order.items():
+        restaurant_ids = set.intersection(*(
+            restaurants_by_product[product_id] for product_id in product_ids
+        ))
+        candidates.extend(
+            OrderCandidate(order_id=order_id, restaurant_id=restaurant_id)
+            for restaurant_id in restaurant_ids
+        )
+    OrderCandidate.objects.bulk_create(candidates, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0057_order_total_cost'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OrderCandidate',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='candidates', to='foodcartapp.order', verbose_name='заказ')),
+                ('restaurant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='order_candidates', to='foodcartapp.restaurant', verbose_name='ресторан')),
+            ],
+            options={
+                'verbose_name': 'ресторан для заказа',
+                'verbose_name_plural': 'рестораны для заказов',
+                'unique_together': {('order', 'restaurant')},
+            },
+        ),
+        migrations.RunPython(fill_candidates, migrations.RunPython.noop),
+    ]
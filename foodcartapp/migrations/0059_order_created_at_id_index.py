@@ -0,0 +1,17 @@
+# Generated by Django 3.2.15 on 2026-10-18 03:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0058_ordercandidate'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='order',
+            index=models.Index(fields=['created_at', 'id'], name='foodcartapp_created_460412_idx'),
+        ),
+    ]
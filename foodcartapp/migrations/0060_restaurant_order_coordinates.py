@@ -0,0 +1,64 @@
+# Generated by Django 3.2.15 on 2026-10-18 04:04
+
+from django.db import migrations, models
+
+
+DONE = 4
+
+
+def fill_coordinates(apps, schema_editor):
+    Location = apps.get_model('place_coords', 'Location')
+    Order = apps.get_model('foodcartapp', 'Order')
+    Restaurant = apps.get_model('foodcartapp', 'Restaurant')
+
+    locations = Location.objects.\
+        filter(correct_address=True).\
+        values_list('address', 'latitude', 'longitude')
+    coords = {address: (lat, lon) for address, lat, lon in locations}
+    for model, instances in [
+        (Order, Order.objects.exclude(status=DONE)),
+        (Restaurant, Restaurant.objects.all()),
+    ]:
+        instances = [
+            instance for instance in instances
+            if instance.address in coords
+        ]
+        for instance in instances:
+            instance.latitude, instance.longitude = coords[instance.address]
+        model.objects.bulk_update(
+            instances,
+            ['latitude', 'longitude'],
+            batch_size=1000
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('foodcartapp', '0059_order_created_at_id_index'),
+        ('place_coords', '0002_auto_20250204_1220'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='order',
+            name='latitude',
+            field=models.DecimalField(decimal_places=6, editable=False, max_digits=9, null=True, verbose_name='широта'),
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='longitude',
+            field=models.DecimalField(decimal_places=6, editable=False, max_digits=9, null=True, verbose_name='долгота'),
+        ),
+        migrations.AddField(
+            model_name='restaurant',
+            name='latitude',
+            field=models.DecimalField(decimal_places=6, editable=False, max_digits=9, null=True, verbose_name='широта'),
+        ),
+        migrations.AddField(
+            model_name='restaurant',
+            name='longitude',
+            field=models.DecimalField(decimal_places=6, editable=False, max_digits=9, null=True, verbose_name='долгота'),
+        ),
+        migrations.RunPython(fill_coordinates, migrations.RunPython.noop),
+    ]
@@ -1,6 +1,7 @@
-from django.db import models
+from django.db import models, transaction
 from django.core.validators import MinValueValidator
-from django.db.models import Sum, F
+from django.db.models import Count, Exists, F, OuterRef, Q, Subquery, Sum
+from django.db.models.functions import Coalesce
 from django.utils.translation import gettext_lazy as _
 from django.utils import timezone
 
@@ -23,6 +24,20 @@ class Restaurant(models.Model):
         max_length=50,
         blank=True,
     )
+    latitude = models.DecimalField(
+        'широта',
+        max_digits=9,
+        decimal_places=6,
+        null=True,
+        editable=False,
+    )
+    longitude = models.DecimalField(
+        'долгота',
+        max_digits=9,
+        decimal_places=6,
+        null=True,
+        editable=False,
+    )
 
     class Meta:
         verbose_name = 'ресторан'
@@ -34,12 +49,24 @@ class Restaurant(models.Model):
 
 class ProductQuerySet(models.QuerySet):
     def available(self):
-        products = (
+        return self.filter(is_available=True)
+
+    def refresh_availability(self):
+        available_menu_items = (
             RestaurantMenuItem.objects
-            .filter(availability=True)
-            .values_list('product')
+            .filter(product=OuterRef('pk'), availability=True)
+            .order_by()
+            .values('product')
+            .annotate(count=Count('pk'))
+            .values('count')
+        )
+        return self.update(
+            available_restaurants_count=Coalesce(
+                Subquery(available_menu_items),
+                0
+                ),
+            is_available=Exists(available_menu_items),
         )
-        return self.filter(pk__in=products)
 
 
 class ProductCategory(models.Model):
@@ -47,6 +74,12 @@ class ProductCategory(models.Model):
         'название',
         max_length=50
     )
+    updated_at = models.DateTimeField(
+        'время изменения',
+        default=timezone.now,
+        editable=False,
+        db_index=True,
+    )
 
     class Meta:
         verbose_name = 'категория'
@@ -88,17 +121,79 @@ class Product(models.Model):
         max_length=200,
         blank=True,
     )
+    available_restaurants_count = models.PositiveIntegerField(
+        'в продаже в ресторанах',
+        default=0,
+        editable=False,
+    )
+    is_available = models.BooleanField(
+        'в продаже',
+        default=False,
+        db_index=True,
+        editable=False,
+    )
+    image_variants = models.JSONField(
+        'уменьшенные копии картинки',
+        default=dict,
+        blank=True,
+        editable=False,
+    )
+    updated_at = models.DateTimeField(
+        'время изменения',
+        default=timezone.now,
+        editable=False,
+        db_index=True,
+    )
 
     objects = ProductQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'товар'
         verbose_name_plural = 'товары'
+        indexes = [
+            models.Index(fields=['category', 'id']),
+            models.Index(fields=['special_status', 'id']),
+        ]
 
     def __str__(self):
         return self.name
 
 
+class RestaurantMenuItemQuerySet(models.QuerySet):
+    def _refresh_products_availability(self, product_ids):
+        from .candidates import refresh_product_candidates
+        from .catalog import bump_catalog_version
+
+        Product.objects.filter(pk__in=product_ids).refresh_availability()
+        refresh_product_candidates(product_ids)
+        transaction.on_commit(bump_catalog_version)
+
+    def update(self, **kwargs):
+        kwargs.setdefault('updated_at', timezone.now())
+        with transaction.atomic(using=self.db):
+            menu_items = dict(self.values_list('pk', 'product_id'))
+            product_ids = set(menu_items.values())
+            updated = super().update(**kwargs)
+            if 'product' in kwargs or 'product_id' in kwargs:
+                # The moved rows may no longer match the filter, and
+                # bulk_update passes the new products as an expression
+                product_ids |= set(
+                    self.model._base_manager.
+                    filter(pk__in=menu_items).
+                    values_list('product_id', flat=True)
+                )
+            self._refresh_products_availability(product_ids)
+        return updated
+
+    def bulk_create(self, objs, *args, **kwargs):
+        with transaction.atomic(using=self.db):
+            menu_items = super().bulk_create(objs, *args, **kwargs)
+            self._refresh_products_availability(
+                set(item.product_id for item in menu_items)
+                )
+        return menu_items
+
+
 class RestaurantMenuItem(models.Model):
     restaurant = models.ForeignKey(
         Restaurant,
@@ -117,6 +212,14 @@ class RestaurantMenuItem(models.Model):
         default=True,
         db_index=True
     )
+    updated_at = models.DateTimeField(
+        'время изменения',
+        default=timezone.now,
+        editable=False,
+        db_index=True,
+    )
+
+    objects = RestaurantMenuItemQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'пункт меню ресторана'
@@ -129,12 +232,92 @@ class RestaurantMenuItem(models.Model):
         return f"{self.restaurant.name} - {self.product.name}"
 
 
+class ProductTombstone(models.Model):
+    product_id = models.PositiveIntegerField(
+        'id товара',
+        db_index=True,
+    )
+    deleted_at = models.DateTimeField(
+        'время удаления',
+        default=timezone.now,
+        db_index=True,
+    )
+
+    class Meta:
+        verbose_name = 'удалённый товар'
+        verbose_name_plural = 'удалённые товары'
+
+    def __str__(self):
+        return f'{self.product_id} {self.deleted_at}'
+
+
+class BannerQuerySet(models.QuerySet):
+    def active(self, now):
+        return self.filter(
+            Q(active_from__isnull=True) | Q(active_from__lte=now),
+            Q(active_until__isnull=True) | Q(active_until__gt=now),
+        )
+
+
+class Banner(models.Model):
+    title = models.CharField(
+        'заголовок',
+        max_length=50
+    )
+    image = models.ImageField(
+        'картинка'
+    )
+    text = models.CharField(
+        'текст',
+        max_length=200,
+        blank=True,
+    )
+    position = models.PositiveIntegerField(
+        'порядок',
+        default=0,
+        db_index=True,
+    )
+    active_from = models.DateTimeField(
+        'показывать с',
+        null=True,
+        blank=True,
+        db_index=True,
+    )
+    active_until = models.DateTimeField(
+        'показывать до',
+        null=True,
+        blank=True,
+        db_index=True,
+    )
+
+    objects = BannerQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'баннер'
+        verbose_name_plural = 'баннеры'
+        ordering = ['position', 'id']
+
+    def __str__(self):
+        return self.title
+
+
 class OrderQuerySet(models.QuerySet):
-    def annotate_with_total_cost(self):
-        orders = self.prefetch_related('items').all()
-        return orders.annotate(
-            total_cost=Sum(F('items__quantity')*F('items__price'))
-            )
+    def refresh_total_cost(self):
+        items_cost = (
+            OrderItem.objects
+            .filter(order=OuterRef('pk'))
+            .order_by()
+            .values('order')
+            .annotate(total_cost=Sum(F('quantity') * F('price')))
+            .values('total_cost')
+        )
+        return self.update(
+            total_cost=Coalesce(
+                Subquery(items_cost),
+                0,
+                output_field=models.DecimalField()
+                ),
+        )
 
 
 class Order(models.Model):
@@ -172,6 +355,20 @@ class Order(models.Model):
         'адрес',
         max_length=100,
     )
+    latitude = models.DecimalField(
+        'широта',
+        max_digits=9,
+        decimal_places=6,
+        null=True,
+        editable=False,
+    )
+    longitude = models.DecimalField(
+        'долгота',
+        max_digits=9,
+        decimal_places=6,
+        null=True,
+        editable=False,
+    )
     status = models.IntegerField(
         'статус',
         choices=Status.choices,
@@ -207,12 +404,31 @@ class Order(models.Model):
         choices=PaymentMethod.choices,
         db_index=True
     )
+    total_cost = models.DecimalField(
+        'стоимость заказа',
+        max_digits=10,
+        decimal_places=2,
+        default=0,
+        editable=False,
+        db_index=True
+    )
+    ticket = models.CharField(
+        'номер заявки',
+        max_length=32,
+        unique=True,
+        null=True,
+        blank=True,
+        editable=False,
+    )
 
     objects = OrderQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'заказ'
         verbose_name_plural = 'заказы'
+        indexes = [
+            models.Index(fields=['created_at', 'id']),
+        ]
 
     def __str__(self):
         return f"{self.firstname} {self.lastname} {self.address}. {self.get_status_display()}"
@@ -248,3 +464,28 @@ class OrderItem(models.Model):
 
     def __str__(self):
         return f"{self.product} {self.order}"
+
+
+class OrderCandidate(models.Model):
+    order = models.ForeignKey(
+        Order,
+        on_delete=models.CASCADE,
+        related_name='candidates',
+        verbose_name='заказ',
+    )
+    restaurant = models.ForeignKey(
+        Restaurant,
+        on_delete=models.CASCADE,
+        related_name='order_candidates',
+        verbose_name='ресторан',
+    )
+
+    class Meta:
+        verbose_name = 'ресторан для заказа'
+        verbose_name_plural = 'рестораны для заказов'
+        unique_together = [
+            ['order', 'restaurant']
+        ]
+
+    def __str__(self):
+        return f"{self.restaurant} - {self.order}"
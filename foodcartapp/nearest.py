@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.core.cache import cache
+
+from place_coords.spatial import GridIndex
+
+from .models import Restaurant
+from .versions import bump_version, get_version
+
+
+RESTAURANT_LOCATIONS_VERSION_KEY = 'restaurants:locations:version'
+RESTAURANT_GRID_KEY = 'restaurants:grid:{version}'
+
+
+def bump_restaurant_locations_version():
+    bump_version(RESTAURANT_LOCATIONS_VERSION_KEY)
+
+
+def build_restaurant_grid_index():
+    restaurants = Restaurant.objects.\
+        filter(latitude__isnull=False, longitude__isnull=False).\
+        values_list('id', 'latitude', 'longitude')
+    return GridIndex(
+        {restaurant_id: (lat, lon) for restaurant_id, lat, lon in restaurants},
+        cell_km=settings.NEAREST_RESTAURANTS_GRID_CELL_KM,
+    )
+
+
+def get_restaurant_grid_index():
+    version = get_version(RESTAURANT_LOCATIONS_VERSION_KEY)
+    key = RESTAURANT_GRID_KEY.format(version=version)
+    index = cache.get(key)
+    if index is None:
+        index = build_restaurant_grid_index()
+        cache.set(key, index, timeout=settings.CATALOG_SNAPSHOT_TIMEOUT)
+    return index
@@ -0,0 +1,79 @@
+from decimal import Decimal
+from django.db import connection
+
+from .candidates import refresh_order_candidates
+from .coordinates import resolve_coordinates
+from .models import Order, OrderItem
+
+
+def collect_product_ids(orders_data):
+    product_ids = set()
+    for order_data in orders_data:
+        if not isinstance(order_data, dict):
+            continue
+        items = order_data.get('products')
+        if not isinstance(items, list):
+            continue
+        for item in items:
+            if not isinstance(item, dict):
+                continue
+            try:
+                product_ids.add(int(item.get('product')))
+            except (TypeError, ValueError):
+                continue
+    return product_ids
+
+
+def attach_products(items, products):
+    errors = [
+        {} if item['product_id'] in products
+        else {'product': [f'invalid product id {item["product_id"]}']}
+        for item in items
+    ]
+    if any(errors):
+        return errors
+    for item in items:
+        item['product'] = products[item.pop('product_id')]
+
+
+def get_total_cost(items):
+    return sum(
+        (item['product'].price * item['quantity'] for item in items),
+        Decimal(0)
+    )
+
+
+def create_orders(orders_data):
+    orders = [
+        Order(
+            **{
+                field: value
+                for field, value in order_data.items()
+                if field != 'items'
+            },
+            total_cost=get_total_cost(order_data['items']),
+        )
+        for order_data in orders_data
+    ]
+    resolve_coordinates(orders)
+    if connection.features.can_return_rows_from_bulk_insert:
+        Order.objects.bulk_create(orders)
+    else:
+        # Without RETURNING the created orders would have no ids to link
+        # the items to
+        for order in orders:
+            order.save()
+
+    OrderItem.objects.bulk_create([
+        OrderItem(
+            order=order,
+            product=order_item['product'],
+            quantity=order_item['quantity'],
+            price=order_item['product'].price,
+        )
+        for order, order_data in zip(orders, orders_data)
+        for order_item in order_data['items']
+    ])
+    refresh_order_candidates(order.id for order in orders)
+    return orders
+
@@ -0,0 +1,169 @@
+import bisect
+import re
+import threading
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .catalog import get_catalog_version, get_changed_products
+from .catalog import get_changes_horizon, get_deleted_product_ids
+from .models import Product
+
+
+TOKEN_PATTERN = re.compile(r'\w+')
+NAME_WEIGHT = 3
+CATEGORY_WEIGHT = 2
+DESCRIPTION_WEIGHT = 1
+PREFIX_MATCH_FACTOR = 0.75
+TRIGRAM_MATCH_FACTOR = 0.5
+MIN_TRIGRAM_SIMILARITY = 0.4
+
+
+def normalize(text):
+    # casefold() handles Cyrillic properly, unlike SQLite's LOWER()
+    return text.casefold().replace('ё', 'е')
+
+
+def tokenize(text):
+    return TOKEN_PATTERN.findall(normalize(text))
+
+
+def get_trigrams(token):
+    padded = f'  {token} '
+    return {padded[index:index + 3] for index in range(len(padded) - 2)}
+
+
+class ProductSearchIndex:
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.clear()
+
+    def clear(self):
+        self.catalog_version = None
+        self.synced_at = None
+        self.tokens_by_product = {}
+        self.available_products = set()
+        self.postings = {}
+        self.sorted_tokens = []
+        self.tokens_by_trigram = defaultdict(set)
+
+    def add_token(self, token, product_id, weight):
+        postings = self.postings.get(token)
+        if postings is None:
+            postings = self.postings[token] = {}
+            bisect.insort(self.sorted_tokens, token)
+            for trigram in get_trigrams(token):
+                self.tokens_by_trigram[trigram].add(token)
+        postings[product_id] = max(weight, postings.get(product_id, 0))
+
+    def remove_product(self, product_id):
+        self.available_products.discard(product_id)
+        for token in self.tokens_by_product.pop(product_id, ()):
+            postings = self.postings[token]
+            postings.pop(product_id, None)
+            if postings:
+                continue
+            del self.postings[token]
+            del self.sorted_tokens[bisect.bisect_left(self.sorted_tokens, token)]
+            for trigram in get_trigrams(token):
+                self.tokens_by_trigram[trigram].discard(token)
+                if not self.tokens_by_trigram[trigram]:
+                    del self.tokens_by_trigram[trigram]
+
+    def add_product(self, product):
+        self.remove_product(product.id)
+        texts = [
+            (product.name, NAME_WEIGHT),
+            (product.category.name if product.category else '', CATEGORY_WEIGHT),
+            (product.description, DESCRIPTION_WEIGHT),
+        ]
+        tokens = set()
+        for text, weight in texts:
+            for token in tokenize(text):
+                self.add_token(token, product.id, weight)
+                tokens.add(token)
+        self.tokens_by_product[product.id] = tokens
+        if product.is_available:
+            self.available_products.add(product.id)
+
+    def refresh(self):
+        catalog_version = get_catalog_version()
+        with self.lock:
+            if catalog_version == self.catalog_version:
+                return
+            now = timezone.now()
+            if self.synced_at is None or self.synced_at < get_changes_horizon(now):
+                self.clear()
+                products = Product.objects.select_related('category')
+                removed_product_ids = set()
+            else:
+                products = get_changed_products(self.synced_at)
+                removed_product_ids = get_deleted_product_ids(self.synced_at)
+            for product in products:
+                self.add_product(product)
+                removed_product_ids.discard(product.id)
+            for product_id in removed_product_ids:
+                self.remove_product(product_id)
+            self.catalog_version = catalog_version
+            self.synced_at = now - timedelta(
+                seconds=settings.CATALOG_CHANGES_SAFETY_LAG
+                )
+
+    def match_token(self, token):
+        matches = {}
+        position = bisect.bisect_left(self.sorted_tokens, token)
+        while position < len(self.sorted_tokens):
+            indexed_token = self.sorted_tokens[position]
+            if not indexed_token.startswith(token):
+                break
+            position += 1
+            factor = 1 if indexed_token == token else PREFIX_MATCH_FACTOR
+            for product_id, weight in self.postings[indexed_token].items():
+                matches[product_id] = max(matches.get(product_id, 0), weight * factor)
+        if matches or len(token) < 3:
+            return matches
+
+        trigrams = get_trigrams(token)
+        shared_trigrams = Counter(
+            indexed_token
+            for trigram in trigrams
+            for indexed_token in self.tokens_by_trigram.get(trigram, ())
+        )
+        for indexed_token, shared in shared_trigrams.items():
+            indexed_trigrams = len(get_trigrams(indexed_token))
+            similarity = shared / (len(trigrams) + indexed_trigrams - shared)
+            if similarity < MIN_TRIGRAM_SIMILARITY:
+                continue
+            factor = TRIGRAM_MATCH_FACTOR * similarity
+            for product_id, weight in self.postings[indexed_token].items():
+                matches[product_id] = max(matches.get(product_id, 0), weight * factor)
+        return matches
+
+    def search(self, query, available_only=False):
+        tokens = tokenize(query)
+        if not tokens:
+            return []
+        with self.lock:
+            scores = None
+            for token in tokens:
+                matches = self.match_token(token)
+                if scores is None:
+                    scores = matches
+                    continue
+                scores = {
+                    product_id: score + matches[product_id]
+                    for product_id, score in scores.items()
+                    if product_id in matches
+                }
+            if available_only:
+                scores = {
+                    product_id: score
+                    for product_id, score in scores.items()
+                    if product_id in self.available_products
+                }
+        return sorted(scores, key=lambda product_id: (-scores[product_id], product_id))
+
+
+product_search_index = ProductSearchIndex()
@@ -1,25 +1,18 @@
-from django.core.exceptions import ValidationError
-
 from .models import Product, Order, OrderItem
+from .orders import attach_products, create_orders
 
 from rest_framework.serializers import ModelSerializer, IntegerField
+from rest_framework.serializers import ValidationError
 
 
 class OrderItemSerializer(ModelSerializer):
-    product = IntegerField(source='product.id')
+    product = IntegerField(source='product_id')
 
     class Meta:
         model = OrderItem
         fields = ['id', 'product', 'quantity']
         read_only_fields = ['id']
 
-    def validate_product(self, value):
-        try:
-            Product.objects.get(id=value)
-        except Product.DoesNotExist:
-            raise ValidationError(f'invalid product id {value}')
-        return value
-
 
 class OrderSerializer(ModelSerializer):
     products = OrderItemSerializer(
@@ -40,17 +33,16 @@ class OrderSerializer(ModelSerializer):
         ]
         read_only_fields = ['id']
 
+    def validate_products(self, items):
+        products = self.context.get('products')
+        if products is None:
+            products = Product.objects.in_bulk(
+                [item['product_id'] for item in items]
+                )
+        errors = attach_products(items, products)
+        if errors:
+            raise ValidationError(errors)
+        return items
+
     def create(self, validated_data):
-        product_items = validated_data.pop('items')
-        order_items = []
-        order = Order.objects.create(**validated_data)
-        for order_item in product_items:
-            product = Product.objects.get(id=order_item['product']['id'])
-            order_items.append(OrderItem(
-                product=product,
-                order=order,
-                quantity=order_item['quantity'],
-                price=product.price
-            ))
-        OrderItem.objects.bulk_create(order_items)
-        return order
+        return create_orders([validated_data])[0]
@@ -0,0 +1,144 @@
+import logging
+
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.db.models.signals import pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from place_coords.models import Location
+from place_coords.signals import locations_saved
+
+from .banners import bump_banners_version
+from .candidates import refresh_product_candidates
+from .catalog import bump_catalog_version, get_changes_horizon
+from .coordinates import apply_locations, resolve_coordinates
+from .images import build_image_variants
+from .models import Banner, Product, ProductCategory, ProductTombstone
+from .models import Order, Restaurant, RestaurantMenuItem
+from .nearest import bump_restaurant_locations_version
+
+
+logger = logging.getLogger(__name__)
+
+
+@receiver([post_save, post_delete], sender=Product)
+@receiver([post_save, post_delete], sender=ProductCategory)
+@receiver([post_save, post_delete], sender=RestaurantMenuItem)
+def invalidate_catalog(sender, **kwargs):
+    transaction.on_commit(bump_catalog_version)
+
+
+@receiver([post_save, post_delete], sender=Banner)
+def invalidate_banners(sender, **kwargs):
+    transaction.on_commit(bump_banners_version)
+
+
+@receiver([post_save, post_delete], sender=Restaurant)
+def invalidate_restaurant_locations(sender, **kwargs):
+    transaction.on_commit(bump_restaurant_locations_version)
+
+
+@receiver(pre_save, sender=Order)
+@receiver(pre_save, sender=Restaurant)
+def resolve_address_coordinates(sender, instance, raw, **kwargs):
+    if raw:
+        return
+    if instance.pk is None:
+        # Orders created in bulk are resolved before they are saved
+        if not getattr(instance, 'coordinates_resolved', False):
+            resolve_coordinates([instance])
+        return
+    previous_address = sender.objects.\
+        filter(pk=instance.pk).\
+        values_list('address', flat=True).\
+        first()
+    if previous_address != instance.address:
+        resolve_coordinates([instance])
+
+
+@receiver(post_save, sender=Location)
+def apply_saved_location(sender, instance, **kwargs):
+    apply_locations([instance])
+
+
+@receiver(locations_saved)
+def apply_saved_locations(sender, locations, **kwargs):
+    apply_locations(locations)
+
+
+@receiver(pre_save, sender=Product)
+@receiver(pre_save, sender=ProductCategory)
+@receiver(pre_save, sender=RestaurantMenuItem)
+def touch_updated_at(sender, instance, raw, **kwargs):
+    if not raw:
+        instance.updated_at = timezone.now()
+
+
+@receiver(post_save, sender=Product)
+def refresh_product_availability(sender, instance, **kwargs):
+    # Availability is derived from the menu items, so a stale value
+    # saved with the instance must not survive
+    Product.objects.filter(pk=instance.pk).refresh_availability()
+
+
+@receiver(post_save, sender=Product)
+def build_product_image_variants(sender, instance, raw, **kwargs):
+    if raw or not instance.image:
+        return
+    if instance.image_variants.get('source') == instance.image.name:
+        return
+    try:
+        image_variants = build_image_variants(
+            instance.image.storage,
+            instance.image.name
+            )
+    except OSError as error:
+        logger.warning('Не удалось уменьшить %s: %s', instance.image.name, error)
+        image_variants = {'source': instance.image.name}
+    Product.objects.filter(pk=instance.pk).update(image_variants=image_variants)
+    instance.image_variants = image_variants
+
+
+@receiver(pre_save, sender=RestaurantMenuItem)
+def remember_menu_item_product(sender, instance, **kwargs):
+    instance.previous_product_id = None
+    if instance.pk:
+        instance.previous_product_id = RestaurantMenuItem.objects.\
+            filter(pk=instance.pk).\
+            values_list('product_id', flat=True).\
+            first()
+
+
+@receiver(post_save, sender=RestaurantMenuItem)
+def refresh_menu_item_availability(sender, instance, **kwargs):
+    product_ids = {instance.product_id, instance.previous_product_id}
+    Product.objects.filter(pk__in=product_ids).refresh_availability()
+    refresh_product_candidates(product_ids)
+    if instance.previous_product_id not in (None, instance.product_id):
+        Product.objects.filter(pk=instance.previous_product_id).\
+            update(updated_at=timezone.now())
+
+
+@receiver(post_delete, sender=RestaurantMenuItem)
+def refresh_deleted_menu_item_availability(sender, instance, **kwargs):
+    products = Product.objects.filter(pk=instance.product_id)
+    products.refresh_availability()
+    products.update(updated_at=timezone.now())
+    refresh_product_candidates([instance.product_id])
+
+
+@receiver(pre_delete, sender=ProductCategory)
+def touch_category_products(sender, instance, **kwargs):
+    # Products lose the category through a queryset update, which does
+    # not send pre_save
+    instance.products.update(updated_at=timezone.now())
+
+
+@receiver(post_delete, sender=Product)
+def create_product_tombstone(sender, instance, **kwargs):
+    now = timezone.now()
+    ProductTombstone.objects.create(product_id=instance.pk, deleted_at=now)
+    ProductTombstone.objects.\
+        filter(deleted_at__lt=get_changes_horizon(now)).\
+        delete()
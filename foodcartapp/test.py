@@ -1,6 +1,42 @@
+import gzip
+import io
+import json
+import os
+import random
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
 from rest_framework.test import APITestCase
 from rest_framework import status
+from rest_framework.exceptions import ValidationError
+from PIL import Image
+
+from place_coords.geocoding import geocoding_worker
+from place_coords.models import Location
+
+from .candidates import refresh_order_candidates
+from .catalog import serialize_product
+from .coordinates import get_addresses_to_refresh
+from .idempotency import get_fingerprint, get_idempotency_cache_key
+from .journal import drain_order_journal, get_order_journal
+from .matching import RestaurantMatchingIndex, build_matching_index
+from .matching import find_restaurants_by_scan
+from .models import Banner, Order, OrderCandidate, Product
+from .models import Restaurant, RestaurantMenuItem
+from .serializers import OrderSerializer
+from .validation import validate_order
+
 
 class MyModelSerializerTest(APITestCase):
     fixtures = ['dummy.json']
@@ -59,3 +95,737 @@ class MyModelSerializerTest(APITestCase):
     def test_good_data(self):
         data = '{"products": [{"product": 1, "quantity": 1}], "firstname": "Василий", "lastname": "Васильевич", "phonenumber": "+79123456789", "address": "Лондон"}'
         self.good_request(data)
+
+
+class ProductListCacheTest(APITestCase):
+    fixtures = ['dummy.json']
+
+    def setUp(self):
+        cache.clear()
+
+    def test_etag(self):
+        response = self.client.get('/api/products/')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['ETag'])
+
+    def test_not_modified(self):
+        etag = self.client.get('/api/products/')['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(
+                '/api/products/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_invalidation(self):
+        etag = self.client.get('/api/products/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            product = Product.objects.get(pk=1)
+            product.name = 'Новое имя'
+            product.save()
+        response = self.client.get('/api/products/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_content_encoding(self):
+        response = self.client.get(
+            '/api/products/', HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        products = json.loads(gzip.decompress(response.content))
+        self.assertEqual(products, self.client.get('/api/products/').json())
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+    def test_streaming(self):
+        products = self.client.get('/api/products/').json()
+        with override_settings(CATALOG_STREAMING=True):
+            response = self.client.get('/api/products/')
+        self.assertTrue(response.streaming)
+        self.assertEqual(json.loads(b''.join(response.streaming_content)), products)
+
+    def test_pretty(self):
+        response = self.client.get('/api/products/?pretty=1')
+        self.assertIn(b'\n    ', response.content)
+        self.assertEqual(
+            response.json(), self.client.get('/api/products/').json())
+
+
+class ProductCatalogPageTest(APITestCase):
+    fixtures = ['dummy.json']
+
+    def test_pages(self):
+        all_products = self.client.get('/api/products/').json()
+        product_ids = []
+        cursor = ''
+        while cursor is not None:
+            page = self.client.get(
+                f'/api/products/catalog/?limit=1&cursor={cursor}').json()
+            self.assertLessEqual(len(page['results']), 1)
+            product_ids += [product['id'] for product in page['results']]
+            cursor = page['next_cursor']
+        self.assertEqual(
+            product_ids, sorted(product['id'] for product in all_products))
+
+    def test_filters(self):
+        page = self.client.get(
+            '/api/products/catalog/?category=1&special_status=false').json()
+        self.assertTrue(page['results'])
+        for product in page['results']:
+            self.assertEqual(product['category']['id'], 1)
+            self.assertFalse(product['special_status'])
+
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/products/catalog/?cursor=abc')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_ids_out_of_range(self):
+        for params in ['cursor=99999999999999999999999', 'category=99999999999999999999999']:
+            response = self.client.get(f'/api/products/catalog/?{params}')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ProductAvailabilityTest(APITestCase):
+    fixtures = ['dummy.json']
+
+    def test_menu_item_save(self):
+        menu_item = RestaurantMenuItem.objects.get(pk=3)
+        menu_item.availability = False
+        menu_item.save()
+        product = Product.objects.get(pk=3)
+        self.assertFalse(product.is_available)
+        self.assertEqual(product.available_restaurants_count, 0)
+
+    def test_bulk_update(self):
+        RestaurantMenuItem.objects.filter(restaurant=2).update(
+            availability=False)
+        self.assertEqual(
+            list(Product.objects.order_by('id').values_list(
+                'id', 'available_restaurants_count', 'is_available')),
+            [(1, 1, True), (2, 1, True), (3, 0, False)]
+        )
+
+    def test_bulk_move_to_other_product(self):
+        RestaurantMenuItem.objects.filter(restaurant=1, product=2).\
+            update(product=Product.objects.get(pk=3))
+        RestaurantMenuItem.objects.filter(restaurant=1, product=1).\
+            update(product_id=2)
+        self.assertEqual(
+            list(Product.objects.order_by('id').values_list(
+                'id', 'available_restaurants_count', 'is_available')),
+            [(1, 1, True), (2, 2, True), (3, 2, True)]
+        )
+
+    def test_bulk_update_products(self):
+        menu_items = list(RestaurantMenuItem.objects.filter(restaurant=1))
+        for menu_item in menu_items:
+            if menu_item.product_id == 2:
+                menu_item.product_id = 3
+        RestaurantMenuItem.objects.bulk_update(menu_items, ['product'])
+        self.assertEqual(
+            list(Product.objects.order_by('id').values_list(
+                'id', 'available_restaurants_count', 'is_available')),
+            [(1, 2, True), (2, 1, True), (3, 2, True)]
+        )
+
+    def test_menu_item_delete(self):
+        RestaurantMenuItem.objects.filter(product=3).delete()
+        self.assertFalse(Product.objects.get(pk=3).is_available)
+
+
+class BannerListTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_active_banners(self):
+        now = timezone.now()
+        Banner.objects.all().delete()
+        Banner.objects.create(title='Второй', image='b.jpg', position=2)
+        Banner.objects.create(title='Первый', image='a.jpg', position=1)
+        Banner.objects.create(
+            title='Прошедший',
+            image='c.jpg',
+            active_until=now - timezone.timedelta(days=1),
+        )
+        Banner.objects.create(
+            title='Будущий',
+            image='d.jpg',
+            active_from=now + timezone.timedelta(minutes=1),
+        )
+        response = self.client.get('/api/banners/')
+        self.assertEqual(
+            [banner['title'] for banner in response.json()],
+            ['Первый', 'Второй']
+        )
+        self.assertIn('public', response['Cache-Control'])
+        max_age = int(response['Cache-Control'].split('max-age=')[1])
+        self.assertLessEqual(max_age, 60)
+        self.assertTrue(response['ETag'])
+
+    def test_invalidation(self):
+        self.client.get('/api/banners/')
+        with self.captureOnCommitCallbacks(execute=True):
+            Banner.objects.create(title='Новый', image='new.jpg', position=100)
+        titles = [banner['title'] for banner in self.client.get('/api/banners/').json()]
+        self.assertEqual(titles[-1], 'Новый')
+
+
+class ProductImageVariantsTest(APITestCase):
+    def setUp(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        cache.clear()
+
+    def test_variants(self):
+        buffer = io.BytesIO()
+        Image.new('RGBA', (2000, 1000), 'red').save(buffer, 'PNG')
+        product = Product.objects.create(
+            name='Бургер',
+            price=100,
+            image=SimpleUploadedFile('burger.png', buffer.getvalue()),
+        )
+        product.refresh_from_db()
+        thumbnail = product.image_variants['variants']['thumbnail']
+        self.assertEqual((thumbnail['width'], thumbnail['height']), (100, 50))
+        self.assertTrue(product.image.storage.exists(thumbnail['jpeg']))
+
+        srcset = serialize_product(product)['image_srcset']
+        self.assertEqual(len(srcset['jpeg'].split(', ')), 3)
+        self.assertIn(' 100w', srcset['jpeg'])
+
+        call_command(
+            'build_image_variants', '--force', '--workers', '1',
+            stdout=io.StringIO())
+        self.assertGreater(
+            Product.objects.get(pk=product.pk).updated_at,
+            product.updated_at
+        )
+
+
+@override_settings(CATALOG_CHANGES_SAFETY_LAG=0)
+class ProductChangesTest(APITestCase):
+    fixtures = ['dummy.json']
+
+    def get_changes(self, since=None):
+        url = '/api/products/changes/'
+        if since is not None:
+            url += f'?since={since}'
+        return self.client.get(url).json()
+
+    def test_full_snapshot(self):
+        changes = self.get_changes()
+        self.assertTrue(changes['full'])
+        self.assertEqual(len(changes['changed']), Product.objects.available().count())
+        self.assertTrue(self.get_changes(since=0)['full'])
+
+    def test_delta(self):
+        version = self.get_changes()['version']
+        self.assertEqual(self.get_changes(version)['changed'], [])
+
+        product = Product.objects.get(pk=1)
+        product.name = 'Новое имя'
+        product.save()
+        RestaurantMenuItem.objects.filter(product=3).update(availability=False)
+        Product.objects.get(pk=2).delete()
+
+        changes = self.get_changes(version)
+        self.assertFalse(changes['full'])
+        self.assertEqual(
+            [product['name'] for product in changes['changed']],
+            ['Новое имя']
+        )
+        self.assertEqual(changes['removed'], [2, 3])
+
+    def test_rebuild_availability_command(self):
+        Product.objects.filter(pk=1).update(available_restaurants_count=5)
+        version = self.get_changes()['version']
+        call_command('rebuild_product_availability', stdout=io.StringIO())
+        self.assertEqual(
+            [product['id'] for product in self.get_changes(version)['changed']],
+            [1]
+        )
+
+    def test_invalid_version(self):
+        response = self.client.get('/api/products/changes/?since=abc')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_version_out_of_range(self):
+        response = self.client.get('/api/products/changes/?since=100000000000000000000')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ProductSearchTest(APITestCase):
+    fixtures = ['dummy.json']
+
+    def setUp(self):
+        cache.clear()
+
+    def search(self, query):
+        response = self.client.get('/api/products/search/', {'q': query})
+        return [product['id'] for product in response.json()]
+
+    def test_case_folding(self):
+        self.assertEqual(self.search('ЛОНГ'), [2])
+        self.assertEqual(self.search('стейкхаус'), [1])
+
+    def test_prefix(self):
+        self.assertEqual(self.search('стей'), [1])
+        self.assertEqual(self.search('лонг чиз'), [2])
+
+    def test_typo(self):
+        self.assertEqual(self.search('чизбургир'), [2])
+
+    def test_index_refresh(self):
+        self.assertEqual(self.search('воппер'), [3])
+        with self.captureOnCommitCallbacks(execute=True):
+            product = Product.objects.get(pk=3)
+            product.name = 'Тройной Гамбургер'
+            product.save()
+        self.assertEqual(self.search('воппер'), [3])
+        self.assertEqual(self.search('гамбургер'), [3])
+        with self.captureOnCommitCallbacks(execute=True):
+            RestaurantMenuItem.objects.filter(product=3).delete()
+        self.assertEqual(self.search('гамбургер'), [])
+
+
+class RegisterOrderQueriesTest(APITestCase):
+    fixtures = ['dummy.json']
+
+    def count_queries(self, cart_size):
+        data = {
+            'products': [
+                {'product': product_id % 3 + 1, 'quantity': 1}
+                for product_id in range(cart_size)
+            ],
+            'firstname': 'Иван',
+            'lastname': 'Петров',
+            'phonenumber': '+79291000000',
+            'address': 'Москва',
+        }
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                reverse('foodcartapp:order'), data=data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return len(queries)
+
+    def test_constant_queries(self):
+        self.assertEqual(self.count_queries(1), self.count_queries(20))
+
+
+class RegisterOrdersBulkTest(APITestCase):
+    fixtures = ['dummy.json']
+
+    def test_results(self):
+        good_order = {
+            'products': [{'product': 1, 'quantity': 2}],
+            'firstname': 'Иван',
+            'lastname': 'Петров',
+            'phonenumber': '+79291000000',
+            'address': 'Москва',
+        }
+        bad_order = dict(good_order, products=[{'product': 9999, 'quantity': 1}])
+        orders_count = Order.objects.count()
+        response = self.client.post(
+            reverse('foodcartapp:orders_bulk'),
+            data=[good_order, bad_order, good_order],
+            format='json',
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.json()['results']
+        self.assertEqual(
+            [result['status'] for result in results],
+            [status.HTTP_201_CREATED, status.HTTP_400_BAD_REQUEST, status.HTTP_201_CREATED]
+        )
+        self.assertIn('products', results[1]['errors'])
+        self.assertEqual(Order.objects.count(), orders_count + 2)
+        order = Order.objects.get(pk=results[0]['id'])
+        self.assertEqual(order.items.get().price, Product.objects.get(pk=1).price)
+
+    def test_one_location_lookup(self):
+        orders = [
+            {
+                'products': [{'product': 1, 'quantity': 1}],
+                'firstname': 'Иван',
+                'phonenumber': '+79291000000',
+                'address': f'Москва, Тверская {number}',
+            }
+            for number in range(40)
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            with self.captureOnCommitCallbacks() as callbacks:
+                response = self.client.post(
+                    reverse('foodcartapp:orders_bulk'), data=orders, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            len([
+                query for query in queries
+                if Location._meta.db_table in query['sql']
+            ]),
+            1,
+        )
+        # Only the unknown addresses are sent to the geocoder, once
+        self.assertEqual(
+            len([
+                callback for callback in callbacks
+                if getattr(callback, 'func', None) == geocoding_worker.enqueue
+            ]),
+            1,
+        )
+
+    def test_not_a_list(self):
+        response = self.client.post(
+            reverse('foodcartapp:orders_bulk'), data={}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class OrderJournalTest(APITestCase):
+    fixtures = ['dummy.json']
+    order = {
+        'products': [{'product': 1, 'quantity': 2}],
+        'firstname': 'Иван',
+        'lastname': 'Петров',
+        'phonenumber': '+79291000000',
+        'address': 'Москва',
+    }
+
+    def setUp(self):
+        journal_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(journal_dir.cleanup)
+        settings_override = override_settings(
+            ORDER_INTAKE_ASYNC=True,
+            ORDER_JOURNAL_PATH=os.path.join(journal_dir.name, 'journal.sqlite3'),
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_accept_then_persist(self):
+        orders_count = Order.objects.count()
+        response = self.client.post(
+            reverse('foodcartapp:order'), data=self.order, format='json')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(Order.objects.count(), orders_count)
+        status_url = response.json()['status_url']
+        self.assertEqual(self.client.get(status_url).json()['status'], 'pending')
+
+        drain_order_journal(get_order_journal(), batch_size=10)
+        ticket = self.client.get(status_url).json()
+        self.assertEqual(ticket['status'], 'done')
+        self.assertEqual(Order.objects.get(pk=ticket['order_id']).items.count(), 1)
+
+    def test_replay_after_crash(self):
+        journal = get_order_journal()
+        ticket = journal.append(self.order)
+        drain_order_journal(journal, batch_size=10)
+        journal.connection.execute(
+            "UPDATE entries SET status = 'pending' WHERE ticket = ?", (ticket,))
+        orders_count = Order.objects.count()
+        drain_order_journal(journal, batch_size=10)
+        self.assertEqual(Order.objects.count(), orders_count)
+        self.assertEqual(journal.get(ticket)['status'], 'done')
+
+    def test_invalid_order(self):
+        response = self.client.post(
+            reverse('foodcartapp:order'), data={'products': []}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class IdempotentOrderTest(APITestCase):
+    fixtures = ['dummy.json']
+    order = OrderJournalTest.order
+
+    def setUp(self):
+        cache.clear()
+
+    def post_order(self, order, key):
+        return self.client.post(
+            reverse('foodcartapp:order'),
+            data=order,
+            format='json',
+            HTTP_IDEMPOTENCY_KEY=key,
+        )
+
+    def test_repeated_request_creates_one_order(self):
+        orders_count = Order.objects.count()
+        first = self.post_order(self.order, 'order-1')
+        second = self.post_order(self.order, 'order-1')
+        self.assertEqual(first.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(Order.objects.count(), orders_count + 1)
+
+    def test_key_reused_with_other_order(self):
+        self.post_order(self.order, 'order-1')
+        response = self.post_order(dict(self.order, address='Казань'), 'order-1')
+        self.assertEqual(response.status_code, status.HTTP_422_UNPROCESSABLE_ENTITY)
+
+    def test_invalid_order_releases_key(self):
+        response = self.post_order({'products': []}, 'order-1')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.post_order({'products': []}, 'order-1')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @override_settings(IDEMPOTENCY_WAIT_TIMEOUT=0)
+    def test_request_in_progress(self):
+        cache.set(get_idempotency_cache_key('order', 'order-1'), {
+            'state': 'pending',
+            'fingerprint': get_fingerprint(self.order),
+        })
+        orders_count = Order.objects.count()
+        response = self.post_order(self.order, 'order-1')
+        self.assertEqual(Order.objects.count(), orders_count)
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+
+
+class OrderTotalCostTest(APITestCase):
+    fixtures = ['dummy.json']
+
+    def test_total_cost_on_create(self):
+        response = self.client.post(
+            reverse('foodcartapp:order'),
+            data=dict(
+                OrderJournalTest.order,
+                products=[
+                    {'product': 1, 'quantity': 2},
+                    {'product': 3, 'quantity': 1},
+                ],
+            ),
+            format='json',
+        )
+        order = Order.objects.get(pk=response.json()['id'])
+        self.assertEqual(order.total_cost, Decimal('867.00'))
+
+    def test_refresh_total_cost(self):
+        order = Order.objects.get(pk=2)
+        order.items.filter(product=2).update(quantity=3)
+        order.items.filter(product=1).delete()
+        Order.objects.filter(pk=order.pk).refresh_total_cost()
+        order.refresh_from_db()
+        self.assertEqual(order.total_cost, Decimal('657.00'))
+
+    def test_verify_command(self):
+        call_command('rebuild_order_totals', '--verify', stdout=io.StringIO())
+        Order.objects.filter(pk=1).update(total_cost=0)
+        with self.assertRaises(CommandError):
+            call_command(
+                'rebuild_order_totals', '--verify',
+                stdout=io.StringIO(), stderr=io.StringIO())
+        call_command('rebuild_order_totals', stdout=io.StringIO())
+        self.assertEqual(Order.objects.get(pk=1).total_cost, Decimal('1095.00'))
+
+
+@override_settings(ORDER_FAST_VALIDATION=True)
+class FastOrderValidationTest(MyModelSerializerTest):
+    payloads = [
+        {},
+        [],
+        None,
+        {'products': None},
+        {'products': 'HelloWorld', 'firstname': [], 'lastname': True},
+        {'products': [], 'firstname': ' ', 'phonenumber': '+70000000000'},
+        {
+            'products': [
+                1,
+                None,
+                {'product': 'a', 'quantity': 0},
+                {'product': '2.0', 'quantity': 1},
+                {'quantity': 1.5},
+            ],
+            'firstname': 'Иван' * 10,
+            'address': 'Москва\x00',
+            'phonenumber': 'x' * 200,
+        },
+        {
+            'products': [{'product': 9999, 'quantity': 1}, {'product': 1, 'quantity': 1}],
+            'firstname': 'Иван',
+            'phonenumber': '+79291000000',
+            'address': 'Москва',
+        },
+    ]
+
+    def test_same_errors(self):
+        for payload in self.payloads:
+            with self.subTest(payload=payload):
+                serializer = OrderSerializer(data=payload)
+                self.assertFalse(serializer.is_valid())
+                with self.assertRaises(ValidationError) as error:
+                    validate_order(payload)
+                self.assertEqual(
+                    json.dumps(error.exception.detail, ensure_ascii=False),
+                    json.dumps(serializer.errors, ensure_ascii=False),
+                )
+
+    def test_same_response(self):
+        order = json.loads(
+            '{"products": [{"product": 1, "quantity": "2"}], "firstname": " Иван ", '
+            '"lastname": "", "phonenumber": "8 929 100-00-00", "address": "Москва"}'
+        )
+        fast_response = self.client.post(
+            reverse('foodcartapp:order'), data=order, format='json')
+        with override_settings(ORDER_FAST_VALIDATION=False):
+            response = self.client.post(
+                reverse('foodcartapp:order'), data=order, format='json')
+        fast_data = fast_response.json()
+        data = response.json()
+        self.assertEqual(fast_data.pop('id') + 1, data.pop('id'))
+        for item in fast_data['products'] + data['products']:
+            item.pop('id')
+        self.assertEqual(fast_data, data)
+
+
+class RestaurantMatchingIndexTest(APITestCase):
+    fixtures = ['dummy.json']
+
+    def test_match(self):
+        index = build_matching_index()
+        self.assertEqual(index.match([1, 2]), [1, 2])
+        self.assertEqual(index.match([3, 1]), [2])
+        self.assertEqual(index.match([3, 9999]), [])
+
+    def test_same_as_scan(self):
+        generator = random.Random(0)
+        menu_items = [
+            (restaurant_id, product_id)
+            for restaurant_id in range(1, 80, 3)
+            for product_id in range(1, 30)
+            if generator.random() < 0.6
+        ]
+        index = RestaurantMatchingIndex(menu_items)
+        for _ in range(200):
+            product_ids = generator.sample(range(1, 30), generator.randint(1, 4))
+            self.assertEqual(
+                set(index.match(product_ids)),
+                find_restaurants_by_scan(product_ids, menu_items)
+            )
+
+
+class OrderCandidateTest(APITestCase):
+    fixtures = ['dummy.json']
+
+    def get_candidates(self, order_id):
+        return set(
+            OrderCandidate.objects.
+            filter(order_id=order_id).
+            values_list('restaurant_id', flat=True)
+        )
+
+    def test_new_order(self):
+        response = self.client.post(
+            reverse('foodcartapp:order'),
+            data=dict(
+                OrderJournalTest.order,
+                products=[{'product': 1, 'quantity': 1}, {'product': 2, 'quantity': 1}],
+            ),
+            format='json',
+        )
+        self.assertEqual(self.get_candidates(response.json()['id']), {1, 2})
+
+    def test_availability_changes(self):
+        refresh_order_candidates(Order.objects.values_list('id', flat=True))
+        self.assertEqual(self.get_candidates(3), {2})
+        menu_item = RestaurantMenuItem.objects.get(restaurant=2, product=3)
+        menu_item.availability = False
+        menu_item.save()
+        self.assertEqual(self.get_candidates(3), set())
+        RestaurantMenuItem.objects.filter(restaurant=1, product=2).\
+            update(availability=False)
+        self.assertEqual(self.get_candidates(1), {2})
+        RestaurantMenuItem.objects.create(restaurant_id=1, product_id=3)
+        RestaurantMenuItem.objects.filter(pk=menu_item.pk).delete()
+        self.assertEqual(self.get_candidates(3), set())
+
+    def test_edit_done_order_in_admin(self):
+        self.client.force_login(
+            User.objects.create_superuser('admin', password='admin')
+            )
+        url = reverse('admin:foodcartapp_order_change', args=[1])
+        data = {
+            'restaurant': 1,
+            'firstname': 'Андрей',
+            'lastname': '',
+            'phonenumber': '+73011234567',
+            'address': 'Москва',
+            'status': Order.Status.DONE,
+            'comment': '',
+            'called_at_0': '',
+            'called_at_1': '',
+            'delivered_at_0': '',
+            'delivered_at_1': '',
+            'payment_method': Order.PaymentMethod.CASH,
+            'items-TOTAL_FORMS': 1,
+            'items-INITIAL_FORMS': 1,
+            'items-MIN_NUM_FORMS': 0,
+            'items-MAX_NUM_FORMS': 1000,
+            'items-0-id': 1,
+            'items-0-order': 1,
+            'items-0-product': 2,
+            'items-0-quantity': 5,
+            'items-0-price': '219.00',
+        }
+        refresh_order_candidates([1])
+        for _ in range(2):
+            response = self.client.post(url, data)
+            self.assertEqual(response.status_code, 302)
+        order = Order.objects.get(pk=1)
+        self.assertEqual(order.status, Order.Status.DONE)
+        self.assertEqual(order.restaurant_id, 1)
+        self.assertEqual(self.get_candidates(1), set())
+
+    def test_rebuild_command(self):
+        with self.assertRaises(CommandError):
+            call_command(
+                'rebuild_order_candidates', '--verify',
+                stdout=io.StringIO(), stderr=io.StringIO())
+        call_command('rebuild_order_candidates', stdout=io.StringIO())
+        call_command(
+            'rebuild_order_candidates', '--verify', stdout=io.StringIO())
+
+
+class CoordinatesTest(APITestCase):
+    fixtures = ['dummy.json']
+
+    def setUp(self):
+        Location.objects.create(address='Москва, Тверская 1', latitude=55.76, longitude=37.61)
+
+    def test_restaurant_address_change(self):
+        restaurant = Restaurant.objects.get(pk=1)
+        restaurant.address = 'Москва, Тверская 1'
+        restaurant.save()
+        restaurant.refresh_from_db()
+        self.assertEqual(restaurant.latitude, Decimal('55.76'))
+
+        restaurant.address = 'Москва, Арбат 2'
+        restaurant.save()
+        restaurant.refresh_from_db()
+        self.assertIsNone(restaurant.latitude)
+        Location.objects.create(address='Москва, Арбат 2', latitude=55.75, longitude=37.59)
+        restaurant.refresh_from_db()
+        self.assertEqual(restaurant.longitude, Decimal('37.59'))
+
+    def test_new_order(self):
+        response = self.client.post(
+            reverse('foodcartapp:order'),
+            data=dict(OrderJournalTest.order, address='Москва, Тверская 1'),
+            format='json',
+        )
+        order = Order.objects.get(pk=response.json()['id'])
+        self.assertEqual(order.latitude, Decimal('55.76'))
+        self.assertEqual(order.longitude, Decimal('37.61'))
+
+    def test_refresh_open_orders_first(self):
+        Location.objects.bulk_create([
+            Location(address=address, updated_at=timezone.now() - timedelta(days=60))
+            for address in ['Москва, Арбат 2', 'Москва, Тверская 2']
+        ])
+        Location.objects.filter(address='Москва, Арбат 2').\
+            update(updated_at=timezone.now() - timedelta(days=90))
+        Order.objects.filter(pk=1).update(address='Москва, Тверская 2')
+        self.assertEqual(
+            get_addresses_to_refresh(timezone.now(), limit=2),
+            ['Москва, Тверская 2', 'Москва, Арбат 2'],
+        )
+
+    @override_settings(YANDEX_GEO_API_KEY=None)
+    def test_refresh_command_without_api_key(self):
+        with self.assertRaises(CommandError):
+            call_command('refresh_locations', stdout=io.StringIO())
@@ -1,12 +1,24 @@
 from django.urls import path
 
-from .views import product_list_api, banners_list_api, register_order
+from .views import product_list_api, product_catalog_api
+from .views import product_changes_api, product_search_api
+from .views import banners_list_api, register_order, register_orders_bulk
+from .views import order_ticket_status
 
 
 app_name = "foodcartapp"
 
 urlpatterns = [
     path('products/', product_list_api),
+    path('products/catalog/', product_catalog_api),
+    path('products/changes/', product_changes_api),
+    path('products/search/', product_search_api),
     path('banners/', banners_list_api),
     path('order/', register_order, name='order'),
+    path('orders/bulk/', register_orders_bulk, name='orders_bulk'),
+    path(
+        'order/tickets/<str:ticket>/',
+        order_ticket_status,
+        name='order_ticket'
+    ),
 ]
@@ -0,0 +1,204 @@
+from collections.abc import Mapping
+from functools import lru_cache
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from rest_framework.exceptions import ValidationError
+from rest_framework.fields import CharField, IntegerField
+from rest_framework.serializers import ListSerializer, Serializer
+from rest_framework.settings import api_settings
+
+from .models import Product
+from .orders import attach_products
+from .serializers import OrderSerializer
+
+
+NON_FIELD_ERRORS = api_settings.NON_FIELD_ERRORS_KEY
+MISSING = object()
+
+
+class Invalid(Exception):
+    def __init__(self, detail):
+        self.detail = detail
+
+
+class Skip(Exception):
+    pass
+
+
+def fail(field, key, **kwargs):
+    raise Invalid([str(field.error_messages[key]).format(**kwargs)])
+
+
+def run_validators(validators, value):
+    errors = []
+    for validator in validators:
+        try:
+            validator(value)
+        except ValidationError as error:
+            errors.extend(str(message) for message in error.detail)
+        except DjangoValidationError as error:
+            errors.extend(str(message) for message in error.messages)
+    if errors:
+        raise Invalid(errors)
+
+
+def check_empty(field, data):
+    if data is MISSING:
+        if field.required:
+            fail(field, 'required')
+        raise Skip()
+    if data is None and not field.allow_null:
+        fail(field, 'null')
+
+
+def compile_char_field(field):
+    validators = field.validators
+
+    def check(data):
+        if data == '' or (field.trim_whitespace and str(data).strip() == ''):
+            if not field.allow_blank:
+                fail(field, 'blank')
+            return ''
+        check_empty(field, data)
+        if isinstance(data, bool) or not isinstance(data, (str, int, float)):
+            fail(field, 'invalid')
+        value = str(data)
+        if field.trim_whitespace:
+            value = value.strip()
+        run_validators(validators, value)
+        return value
+    return check
+
+
+def compile_integer_field(field):
+    validators = field.validators
+    max_string_length = field.MAX_STRING_LENGTH
+    re_decimal = field.re_decimal
+
+    def check(data):
+        check_empty(field, data)
+        if isinstance(data, str) and len(data) > max_string_length:
+            fail(field, 'max_string_length')
+        try:
+            value = int(re_decimal.sub('', str(data)))
+        except (ValueError, TypeError):
+            fail(field, 'invalid')
+        run_validators(validators, value)
+        return value
+    return check
+
+
+def compile_serializer(serializer):
+    fields = [
+        (name, field.source, compile_field(field))
+        for name, field in serializer.fields.items()
+        if not field.read_only
+    ]
+
+    def check(data):
+        check_empty(serializer, data)
+        if not isinstance(data, Mapping):
+            raise Invalid({NON_FIELD_ERRORS: [
+                str(serializer.error_messages['invalid']).
+                format(datatype=type(data).__name__)
+            ]})
+        validated = {}
+        errors = {}
+        for name, source, check_field in fields:
+            try:
+                validated[source] = check_field(data.get(name, MISSING))
+            except Invalid as error:
+                errors[name] = error.detail
+            except Skip:
+                pass
+        if errors:
+            raise Invalid(errors)
+        return validated
+    return check
+
+
+def compile_list_serializer(serializer):
+    check_child = compile_serializer(serializer.child)
+
+    def check(data):
+        check_empty(serializer, data)
+        if not isinstance(data, list):
+            raise Invalid({NON_FIELD_ERRORS: [
+                str(serializer.error_messages['not_a_list']).
+                format(input_type=type(data).__name__)
+            ]})
+        if not serializer.allow_empty and not data:
+            raise Invalid({NON_FIELD_ERRORS: [
+                str(serializer.error_messages['empty'])
+            ]})
+        validated = []
+        errors = []
+        for item in data:
+            try:
+                validated.append(check_child(item))
+                errors.append({})
+            except Invalid as error:
+                errors.append(error.detail)
+        if any(errors):
+            raise Invalid(errors)
+        return validated
+    return check
+
+
+def compile_field(field):
+    # Only the field types OrderSerializer uses are supported, a new one
+    # must be added here to keep both paths in sync
+    if isinstance(field, ListSerializer):
+        return compile_list_serializer(field)
+    if isinstance(field, Serializer):
+        return compile_serializer(field)
+    if isinstance(field, CharField):
+        return compile_char_field(field)
+    if isinstance(field, IntegerField):
+        return compile_integer_field(field)
+    raise TypeError(f'Поле {field!r} не поддерживается быстрой проверкой')
+
+
+@lru_cache(maxsize=None)
+def get_order_checker():
+    return compile_serializer(OrderSerializer())
+
+
+def validate_order(data, products=None):
+    if data is None:
+        # DRF replaces the null error of a root serializer with this one
+        raise ValidationError({NON_FIELD_ERRORS: ['No data provided']})
+    try:
+        validated_data = get_order_checker()(data)
+    except Invalid as error:
+        detail = error.detail
+        if isinstance(detail, list):
+            detail = {NON_FIELD_ERRORS: detail}
+        raise ValidationError(detail)
+    items = validated_data['items']
+    if products is None:
+        products = Product.objects.in_bulk(
+            [item['product_id'] for item in items]
+            )
+    errors = attach_products(items, products)
+    if errors:
+        raise ValidationError({'products': errors})
+    return validated_data
+
+
+def serialize_order(order):
+    return {
+        'id': order.id,
+        'products': [
+            {
+                'id': item.id,
+                'product': item.product_id,
+                'quantity': item.quantity,
+            }
+            for item in order.items.all()
+        ],
+        'firstname': order.firstname,
+        'lastname': order.lastname,
+        'address': order.address,
+        'phonenumber': str(order.phonenumber),
+    }
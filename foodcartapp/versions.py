@@ -0,0 +1,25 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+def get_version(key):
+    version = cache.get(key)
+    if version is None:
+        # Start from a timestamp so that versions keep growing even if
+        # the cache was flushed or the counter expired
+        cache.add(
+            key,
+            time.time_ns() // 1000,
+            timeout=settings.CACHE_VERSION_TIMEOUT
+            )
+        version = cache.get(key)
+    return version
+
+
+def bump_version(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        get_version(key)
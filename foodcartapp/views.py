@@ -1,74 +1,238 @@
-from django.http import JsonResponse
-from django.templatetags.static import static
+from django import forms
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
 from django.db import transaction
+from django.urls import reverse
+from django.utils.cache import patch_cache_control
 
-from .serializers import OrderSerializer
+from .banners import get_banners_max_age, get_banners_payload
+from .catalog import get_catalog_changes, get_catalog_snapshot
+from .catalog import iter_catalog_products
+from .catalog import serialize_product, version_to_datetime
+from .encoding import payload_response, stream_json_array
+from .idempotency import run_idempotent
+from .journal import get_order_journal
 from .models import Product
+from .orders import collect_product_ids, create_orders
+from .search import product_search_index
+from .serializers import OrderSerializer
+from .validation import serialize_order, validate_order
 
 from rest_framework import status
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
 
 
+CATALOG_PAGE_DEFAULT_LIMIT = 50
+CATALOG_PAGE_MAX_LIMIT = 200
+SEARCH_DEFAULT_LIMIT = 20
+SEARCH_MAX_LIMIT = 100
+# The range of AutoField and the foreign keys to it
+MAX_ID = 2 ** 31 - 1
+
+
 def banners_list_api(request):
-    # FIXME move data to db?
-    return JsonResponse([
-        {
-            'title': 'Burger',
-            'src': static('burger.jpg'),
-            'text': 'Tasty Burger at your door step',
-        },
-        {
-            'title': 'Spices',
-            'src': static('food.jpg'),
-            'text': 'All Cuisines',
-        },
-        {
-            'title': 'New York',
-            'src': static('tasty.jpg'),
-            'text': 'Food is incomplete without a tasty dessert',
-        }
-    ], safe=False, json_dumps_params={
-        'ensure_ascii': False,
-        'indent': 4,
-    })
+    payload = get_banners_payload()
+    response = payload_response(request, payload)
+    patch_cache_control(
+        response,
+        public=True,
+        max_age=get_banners_max_age(payload)
+        )
+    return response
 
 
 def product_list_api(request):
-    products = Product.objects.select_related('category').available()
-
-    dumped_products = []
-    for product in products:
-        dumped_product = {
-            'id': product.id,
-            'name': product.name,
-            'price': product.price,
-            'special_status': product.special_status,
-            'description': product.description,
-            'category': {
-                'id': product.category.id,
-                'name': product.category.name,
-            } if product.category else None,
-            'image': product.image.url,
-            'restaurant': {
-                'id': product.id,
-                'name': product.name,
-            }
-        }
-        dumped_products.append(dumped_product)
-    return JsonResponse(dumped_products, safe=False, json_dumps_params={
-        'ensure_ascii': False,
-        'indent': 4,
-    })
+    if settings.CATALOG_STREAMING:
+        products = iter_catalog_products(settings.CATALOG_STREAM_CHUNK_SIZE)
+        return StreamingHttpResponse(
+            stream_json_array(products),
+            content_type='application/json'
+            )
+    return payload_response(request, get_catalog_snapshot())
 
 
-@api_view(['POST'])
-def register_order(request):
-    serializer = OrderSerializer(data=request.data)
-    serializer.is_valid(raise_exception=True)
+class CatalogPageForm(forms.Form):
+    cursor = forms.IntegerField(min_value=0, max_value=MAX_ID, required=False)
+    limit = forms.IntegerField(
+        min_value=1,
+        max_value=CATALOG_PAGE_MAX_LIMIT,
+        required=False
+        )
+    category = forms.IntegerField(max_value=MAX_ID, required=False)
+    special_status = forms.NullBooleanField(required=False)
+
+
+class ProductSearchForm(forms.Form):
+    q = forms.CharField(max_length=100)
+    limit = forms.IntegerField(
+        min_value=1,
+        max_value=SEARCH_MAX_LIMIT,
+        required=False
+        )
+
+
+def product_search_api(request):
+    form = ProductSearchForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse(form.errors, status=400)
+
+    limit = form.cleaned_data['limit'] or SEARCH_DEFAULT_LIMIT
+    product_search_index.refresh()
+    product_ids = product_search_index.search(
+        form.cleaned_data['q'],
+        available_only=True
+        )[:limit]
+    products = Product.objects.select_related('category').in_bulk(product_ids)
+    return JsonResponse(
+        [
+            serialize_product(products[product_id])
+            for product_id in product_ids
+            if product_id in products
+        ],
+        safe=False,
+        json_dumps_params={'ensure_ascii': False}
+        )
+
+
+class CatalogChangesForm(forms.Form):
+    since = forms.IntegerField(min_value=0, required=False)
+
+    def clean_since(self):
+        since = self.cleaned_data['since']
+        if since is None:
+            return since
+        try:
+            version_to_datetime(since)
+        except (ValueError, OverflowError, OSError):
+            raise forms.ValidationError('Неизвестная версия каталога.')
+        return since
+
+
+def product_changes_api(request):
+    form = CatalogChangesForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse(form.errors, status=400)
+    return JsonResponse(
+        get_catalog_changes(form.cleaned_data['since']),
+        json_dumps_params={'ensure_ascii': False}
+        )
+
+
+def product_catalog_api(request):
+    form = CatalogPageForm(request.GET)
+    if not form.is_valid():
+        return JsonResponse(form.errors, status=400)
+
+    limit = form.cleaned_data['limit'] or CATALOG_PAGE_DEFAULT_LIMIT
+    products = Product.objects.select_related('category').available().\
+        order_by('id')
+    if form.cleaned_data['cursor'] is not None:
+        products = products.filter(id__gt=form.cleaned_data['cursor'])
+    if form.cleaned_data['category'] is not None:
+        products = products.filter(category_id=form.cleaned_data['category'])
+    if form.cleaned_data['special_status'] is not None:
+        products = products.filter(
+            special_status=form.cleaned_data['special_status']
+            )
+
+    page = list(products[:limit + 1])
+    next_cursor = page[limit - 1].id if len(page) > limit else None
+    return JsonResponse({
+        'results': [serialize_product(product) for product in page[:limit]],
+        'next_cursor': next_cursor,
+    }, json_dumps_params={'ensure_ascii': False})
+
+
+def accept_order(data):
+    if settings.ORDER_FAST_VALIDATION:
+        validated_data = validate_order(data)
+    else:
+        serializer = OrderSerializer(data=data)
+        serializer.is_valid(raise_exception=True)
+        validated_data = serializer.validated_data
+    if settings.ORDER_INTAKE_ASYNC:
+        ticket = get_order_journal().append(data)
+        return Response(
+            {
+                'ticket': ticket,
+                'status_url': reverse('foodcartapp:order_ticket', args=[ticket]),
+            },
+            status=status.HTTP_202_ACCEPTED
+            )
     with transaction.atomic():
-        serializer.save()
+        order = create_orders([validated_data])[0]
+    if settings.ORDER_FAST_VALIDATION:
+        order_data = serialize_order(order)
+    else:
+        order_data = OrderSerializer(order).data
     return Response(
-        serializer.data,
+        order_data,
         status=status.HTTP_201_CREATED
         )
+
+
+@api_view(['POST'])
+def register_order(request):
+    idempotency_key = request.headers.get('Idempotency-Key')
+    if not idempotency_key:
+        return accept_order(request.data)
+    return run_idempotent(
+        'order',
+        idempotency_key,
+        request.data,
+        lambda: accept_order(request.data)
+        )
+
+
+@api_view(['POST'])
+def register_orders_bulk(request):
+    orders_data = request.data
+    if not isinstance(orders_data, list) or not orders_data:
+        return Response(
+            {'orders': ['Ожидается непустой список заказов.']},
+            status=status.HTTP_400_BAD_REQUEST
+            )
+    if len(orders_data) > settings.BULK_ORDERS_MAX_BATCH:
+        return Response(
+            {'orders': [
+                f'Не больше {settings.BULK_ORDERS_MAX_BATCH} заказов за раз.'
+            ]},
+            status=status.HTTP_400_BAD_REQUEST
+            )
+
+    products = Product.objects.in_bulk(collect_product_ids(orders_data))
+    results = [None] * len(orders_data)
+    valid_serializers = []
+    for index, order_data in enumerate(orders_data):
+        serializer = OrderSerializer(
+            data=order_data,
+            context={'products': products}
+            )
+        if serializer.is_valid():
+            valid_serializers.append((index, serializer))
+        else:
+            results[index] = {
+                'status': status.HTTP_400_BAD_REQUEST,
+                'errors': serializer.errors,
+            }
+
+    with transaction.atomic():
+        orders = create_orders([
+            serializer.validated_data
+            for _, serializer in valid_serializers
+        ])
+    for (index, _), order in zip(valid_serializers, orders):
+        results[index] = {
+            'status': status.HTTP_201_CREATED,
+            'id': order.id,
+        }
+    return Response({'results': results})
+
+
+@api_view(['GET'])
+def order_ticket_status(request, ticket):
+    entry = get_order_journal().get(ticket)
+    if entry is None:
+        return Response(status=status.HTTP_404_NOT_FOUND)
+    return Response(entry)
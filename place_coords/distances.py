@@ -0,0 +1,39 @@
+import numpy as np
+from django.conf import settings
+from geopy import distance
+
+
+# Mean Earth radius, the haversine error against the ellipsoid stays
+# within about 0.5% for any pair of points
+EARTH_RADIUS_KM = 6371.0088
+
+
+def to_radians(points):
+    return np.radians(np.asarray(points, dtype=float).reshape(-1, 2))
+
+
+def get_haversine_matrix(points_from, points_to):
+    lat_from, lon_from = to_radians(points_from).T
+    lat_to, lon_to = to_radians(points_to).T
+    half_dlat = (lat_to[np.newaxis, :] - lat_from[:, np.newaxis]) / 2
+    half_dlon = (lon_to[np.newaxis, :] - lon_from[:, np.newaxis]) / 2
+    a = np.sin(half_dlat) ** 2 + \
+        np.cos(lat_from)[:, np.newaxis] * np.cos(lat_to)[np.newaxis, :] * \
+        np.sin(half_dlon) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def get_geodesic_matrix(points_from, points_to):
+    points_to = [tuple(map(float, point)) for point in points_to]
+    matrix = np.empty((len(points_from), len(points_to)))
+    for row, point_from in enumerate(points_from):
+        point_from = tuple(map(float, point_from))
+        for column, point_to in enumerate(points_to):
+            matrix[row, column] = distance.distance(point_from, point_to).km
+    return matrix
+
+
+def get_distance_matrix(points_from, points_to):
+    if settings.DISTANCE_GEODESIC:
+        return get_geodesic_matrix(points_from, points_to)
+    return get_haversine_matrix(points_from, points_to)
@@ -0,0 +1,227 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import timedelta
+from functools import lru_cache
+
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+from django.db import connections
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Location
+from .signals import locations_saved
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RETRY_AFTER = 60
+
+
+@lru_cache(maxsize=None)
+def get_session():
+    # One pool of keep-alive connections shared by all threads, sized so
+    # that concurrent lookups do not open extra connections
+    session = requests.Session()
+    adapter = HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=settings.GEOCODER_CONCURRENCY
+        )
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+def fetch_coordinates(apikey, address):
+    response = get_session().get(
+        settings.GEOCODER_URL,
+        params={
+            "geocode": address,
+            "apikey": apikey,
+            "format": "json",
+        },
+        timeout=(settings.GEOCODER_CONNECT_TIMEOUT, settings.GEOCODER_READ_TIMEOUT),
+    )
+    response.raise_for_status()
+    found_places = response.json()['response']['GeoObjectCollection']['featureMember']
+
+    if not found_places:
+        return None
+
+    most_relevant = found_places[0]
+    lon, lat = most_relevant['GeoObject']['Point']['pos'].split(" ")
+    return lat, lon
+
+
+def fetch_many_coordinates(apikey, addresses):
+    results = {}
+    with ThreadPoolExecutor(max_workers=settings.GEOCODER_CONCURRENCY) as executor:
+        futures = {
+            executor.submit(fetch_coordinates, apikey, address): address
+            for address in addresses
+        }
+        for future in as_completed(futures):
+            address = futures[future]
+            try:
+                results[address] = future.result()
+            except requests.RequestException as error:
+                # Failed lookups are left out, so they are not cached
+                logger.warning('Не удалось найти %s: %s', address, error)
+    return results
+
+
+def save_locations(results):
+    # Negative results are stored too, so a wrong address is not looked
+    # up again on every request
+    if not results:
+        return []
+    now = timezone.now()
+    locations = []
+    for address, coords in results.items():
+        lat, lon = coords or (None, None)
+        locations.append(Location(
+            address=address,
+            latitude=lat,
+            longitude=lon,
+            correct_address=coords is not None,
+            updated_at=now,
+        ))
+    existing_addresses = set(
+        Location.objects.
+        filter(address__in=results.keys()).
+        values_list('address', flat=True)
+    )
+    # Django 3.2 can not update on conflict, so the rows are split. An
+    # address inserted concurrently is skipped, it was just geocoded
+    Location.objects.bulk_create(
+        [
+            location for location in locations
+            if location.address not in existing_addresses
+        ],
+        ignore_conflicts=True,
+    )
+    Location.objects.bulk_update(
+        [
+            location for location in locations
+            if location.address in existing_addresses
+        ],
+        ['latitude', 'longitude', 'correct_address', 'updated_at'],
+    )
+    locations_saved.send(sender=Location, locations=locations)
+    return locations
+
+
+def get_stale_locations(now):
+    return Location.objects.filter(
+        Q(
+            correct_address=True,
+            updated_at__lt=now - timedelta(days=settings.LOCATION_TTL_DAYS),
+        )
+        | Q(
+            correct_address=False,
+            updated_at__lt=now - timedelta(days=settings.LOCATION_NEGATIVE_TTL_DAYS),
+        )
+    )
+
+
+def get_retry_after(response):
+    try:
+        return int(response.headers.get('Retry-After', DEFAULT_RETRY_AFTER))
+    except ValueError:
+        return DEFAULT_RETRY_AFTER
+
+
+class GeocodingWorker:
+    def __init__(self, fetch=fetch_coordinates):
+        self.fetch = fetch
+        self.queue = queue.Queue(maxsize=settings.GEOCODER_QUEUE_SIZE)
+        self.lock = threading.Lock()
+        self.thread = None
+        self.next_request_at = 0
+
+    def enqueue(self, addresses):
+        if not settings.YANDEX_GEO_API_KEY:
+            return
+        self.start()
+        for address in addresses:
+            try:
+                self.queue.put_nowait(address)
+            except queue.Full:
+                # Intake must never wait for the geocoder, the address
+                # will be resolved when the orders page is opened
+                logger.warning('Очередь геокодера переполнена, %s пропущен', address)
+                return
+
+    def start(self):
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(
+                    target=self.run,
+                    name='geocoding',
+                    daemon=True
+                    )
+                self.thread.start()
+
+    def take_batch(self):
+        addresses = {self.queue.get()}
+        deadline = time.monotonic() + settings.GEOCODER_BATCH_WAIT
+        while len(addresses) < settings.GEOCODER_BATCH_SIZE:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                addresses.add(self.queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return addresses
+
+    def wait_for_rate_limit(self):
+        now = time.monotonic()
+        if self.next_request_at > now:
+            time.sleep(self.next_request_at - now)
+        self.next_request_at = max(now, self.next_request_at) + \
+            1 / settings.GEOCODER_RATE_LIMIT
+
+    def geocode(self, addresses):
+        known_addresses = set(
+            Location.objects.
+            filter(address__in=addresses).
+            values_list('address', flat=True)
+        )
+        return self.refresh(set(addresses) - known_addresses)
+
+    def refresh(self, addresses):
+        results = {}
+        for address in sorted(addresses):
+            self.wait_for_rate_limit()
+            try:
+                results[address] = self.fetch(settings.YANDEX_GEO_API_KEY, address)
+            except requests.HTTPError as error:
+                if error.response is None or error.response.status_code != 429:
+                    logger.warning('Не удалось найти %s: %s', address, error)
+                    continue
+                self.next_request_at = time.monotonic() + \
+                    get_retry_after(error.response)
+                logger.warning('Геокодер ограничил запросы, ждём')
+            except requests.RequestException as error:
+                # Network errors are not cached as wrong addresses
+                logger.warning('Не удалось найти %s: %s', address, error)
+        save_locations(results)
+        return results
+
+    def run(self):
+        while True:
+            addresses = self.take_batch()
+            try:
+                self.geocode(addresses)
+            except Exception:
+                logger.exception('Ошибка фонового геокодирования')
+            finally:
+                connections.close_all()
+
+
+geocoding_worker = GeocodingWorker()
@@ -0,0 +1,66 @@
+import random
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+from geopy import distance
+
+from place_coords.distances import get_geodesic_matrix, get_haversine_matrix
+
+
+def get_random_points(generator, count, center, spread):
+    return [
+        (
+            center[0] + generator.uniform(-spread, spread),
+            center[1] + generator.uniform(-spread, spread),
+        )
+        for _ in range(count)
+    ]
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает точность и скорость расчёта расстояний до ресторанов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=50)
+        parser.add_argument('--restaurants', type=int, default=500)
+        parser.add_argument(
+            '--spread',
+            type=float,
+            default=0.5,
+            help='разброс точек вокруг Москвы в градусах',
+        )
+
+    def handle(self, *args, **options):
+        generator = random.Random(0)
+        moscow = (55.75, 37.62)
+        order_points = get_random_points(
+            generator, options['orders'], moscow, options['spread'])
+        restaurant_points = get_random_points(
+            generator, options['restaurants'], moscow, options['spread'])
+
+        started_at = time.perf_counter()
+        for order_point in order_points:
+            for restaurant_point in restaurant_points:
+                distance.distance(order_point, restaurant_point).km
+        loop_elapsed = time.perf_counter() - started_at
+
+        started_at = time.perf_counter()
+        geodesic = get_geodesic_matrix(order_points, restaurant_points)
+        geodesic_elapsed = time.perf_counter() - started_at
+
+        started_at = time.perf_counter()
+        haversine = get_haversine_matrix(order_points, restaurant_points)
+        haversine_elapsed = time.perf_counter() - started_at
+
+        errors = np.abs(haversine - geodesic)
+        relative_errors = errors / np.maximum(geodesic, 1e-9)
+        pairs = len(order_points) * len(restaurant_points)
+        self.stdout.write(f'Пар заказ-ресторан: {pairs}')
+        self.stdout.write(f'Цикл по парам (geopy): {loop_elapsed * 1000:.1f} мс')
+        self.stdout.write(f'Матрица по эллипсоиду: {geodesic_elapsed * 1000:.1f} мс')
+        self.stdout.write(f'Матрица по сфере (NumPy): {haversine_elapsed * 1000:.2f} мс')
+        self.stdout.write(
+            f'Ошибка сферы: до {errors.max() * 1000:.1f} м, '
+            f'до {relative_errors.max() * 100:.2f}%'
+        )
@@ -0,0 +1,5 @@
+from django.dispatch import Signal
+
+
+# Sent with the saved locations, since bulk writes do not send post_save
+locations_saved = Signal()
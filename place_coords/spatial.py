@@ -0,0 +1,130 @@
+import math
+from collections import defaultdict
+
+from .distances import get_haversine_matrix
+
+
+KM_PER_DEGREE = 111.195
+# Checking a few allowed points directly is cheaper than walking the grid
+DIRECT_QUERY_MAX_KEYS = 32
+
+
+class GridIndex:
+    def __init__(self, points, cell_km):
+        self.points = {
+            key: (float(lat), float(lon))
+            for key, (lat, lon) in points.items()
+        }
+        # Longitude cells are sized for the most poleward point, so that
+        # every cell is at least cell_km wide in both directions
+        self.max_abs_lat = max(
+            (abs(lat) for lat, _ in self.points.values()),
+            default=0
+        )
+        self.lat_step = cell_km / KM_PER_DEGREE
+        self.lon_step = cell_km / (
+            KM_PER_DEGREE * max(math.cos(math.radians(self.max_abs_lat)), 0.01)
+            )
+        self.cells = defaultdict(list)
+        for key, point in self.points.items():
+            self.cells[self.get_cell(point)].append(key)
+        rows = [row for row, _ in self.cells] or [0]
+        columns = [column for _, column in self.cells] or [0]
+        self.bounds = (min(rows), max(rows), min(columns), max(columns))
+
+    def get_cell(self, point):
+        lat, lon = point
+        return math.floor(lat / self.lat_step), math.floor(lon / self.lon_step)
+
+    def get_cell_km(self, lat):
+        # The narrowest a cell can be between the query and the points
+        lat = min(max(abs(lat), self.max_abs_lat), 89)
+        return min(
+            self.lat_step * KM_PER_DEGREE,
+            self.lon_step * KM_PER_DEGREE * math.cos(math.radians(lat))
+        )
+
+    def iter_ring(self, cell, ring):
+        row, column = cell
+        if ring == 0:
+            yield cell
+            return
+        for shift in range(-ring, ring + 1):
+            yield row - ring, column + shift
+            yield row + ring, column + shift
+        for shift in range(-ring + 1, ring):
+            yield row + shift, column - ring
+            yield row + shift, column + ring
+
+    def covers_bounds(self, cell, ring):
+        min_row, max_row, min_column, max_column = self.bounds
+        row, column = cell
+        return row - ring <= min_row and row + ring >= max_row and \
+            column - ring <= min_column and column + ring >= max_column
+
+    def get_first_ring(self, cell):
+        # Rings closer than the nearest occupied cell are empty
+        min_row, max_row, min_column, max_column = self.bounds
+        row, column = cell
+        return max(
+            0,
+            min_row - row,
+            row - max_row,
+            min_column - column,
+            column - max_column,
+        )
+
+    def query_directly(self, point, limit, radius_km, keys):
+        keys = [key for key in keys if key in self.points]
+        if not keys:
+            return []
+        distances = get_haversine_matrix(
+            [point],
+            [self.points[key] for key in keys]
+            )[0]
+        found = sorted(
+            (float(distance), key)
+            for distance, key in zip(distances, keys)
+            if radius_km is None or distance <= radius_km
+        )
+        return found[:limit]
+
+    def query(self, point, limit=None, radius_km=None, allowed_keys=None):
+        point = (float(point[0]), float(point[1]))
+        if not self.points:
+            return []
+        if allowed_keys is not None and len(allowed_keys) <= DIRECT_QUERY_MAX_KEYS:
+            return self.query_directly(point, limit, radius_km, allowed_keys)
+        cell = self.get_cell(point)
+        cell_km = self.get_cell_km(point[0])
+        found = []
+        ring = self.get_first_ring(cell)
+        while True:
+            keys = [
+                key
+                for ring_cell in self.iter_ring(cell, ring)
+                for key in self.cells.get(ring_cell, ())
+                if allowed_keys is None or key in allowed_keys
+            ]
+            if keys:
+                distances = get_haversine_matrix(
+                    [point],
+                    [self.points[key] for key in keys]
+                    )[0]
+                found.extend(
+                    (float(distance), key)
+                    for distance, key in zip(distances, keys)
+                    if radius_km is None or distance <= radius_km
+                )
+                found.sort()
+            # Points outside the rings scanned so far are at least this far
+            scanned_km = ring * cell_km
+            if limit is not None and len(found) >= limit and \
+                    found[limit - 1][0] <= scanned_km:
+                break
+            if radius_km is not None and scanned_km >= radius_km:
+                break
+            if self.covers_bounds(cell, ring):
+                break
+            ring += 1
+        return found[:limit]
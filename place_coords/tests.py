@@ -1,3 +1,242 @@
-from django.test import TestCase
+import json
+import random
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
 
-# Create your tests here.
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+import numpy as np
+import requests
+
+from .distances import get_geodesic_matrix, get_haversine_matrix
+from .geocoding import GeocodingWorker, fetch_coordinates
+from .geocoding import fetch_many_coordinates, get_session, save_locations
+from .geocoding import get_stale_locations
+from .models import Location
+from .signals import locations_saved
+from .spatial import GridIndex
+
+
+class StubGeocoderHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.server.client_ports.add(self.client_address[1])
+        address = parse_qs(urlparse(self.path).query)['geocode'][0]
+        if address == 'Медленный':
+            time.sleep(1)
+        elif address.startswith('Долгий'):
+            time.sleep(0.3)
+        found_places = []
+        if address != 'Нигде':
+            found_places.append({'GeoObject': {'Point': {'pos': '37.6 55.75'}}})
+        body = json.dumps({
+            'response': {'GeoObjectCollection': {'featureMember': found_places}}
+        }).encode()
+        try:
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client has already given up on a slow response
+            pass
+
+    def log_message(self, *args):
+        pass
+
+
+class GeocoderClientTest(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), StubGeocoderHandler)
+        cls.server.daemon_threads = True
+        cls.server.client_ports = set()
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        settings_override = override_settings(
+            GEOCODER_URL=f'http://127.0.0.1:{cls.server.server_port}/1.x',
+            GEOCODER_CONCURRENCY=4,
+            GEOCODER_READ_TIMEOUT=0.5,
+        )
+        settings_override.enable()
+        cls.addClassCleanup(settings_override.disable)
+        cls.addClassCleanup(cls.server.server_close)
+        cls.addClassCleanup(cls.server.shutdown)
+
+    def setUp(self):
+        get_session.cache_clear()
+        self.addCleanup(get_session.cache_clear)
+        self.server.client_ports.clear()
+
+    def test_keep_alive(self):
+        for _ in range(5):
+            self.assertEqual(fetch_coordinates('key', 'Москва'), ('55.75', '37.6'))
+        self.assertEqual(len(self.server.client_ports), 1)
+
+    def test_fetch_many(self):
+        started_at = time.monotonic()
+        results = fetch_many_coordinates(
+            'key',
+            ['Долгий 1', 'Долгий 2', 'Долгий 3', 'Долгий 4', 'Нигде', 'Медленный'],
+        )
+        self.assertLess(time.monotonic() - started_at, 1)
+        self.assertEqual(results, {
+            'Долгий 1': ('55.75', '37.6'),
+            'Долгий 2': ('55.75', '37.6'),
+            'Долгий 3': ('55.75', '37.6'),
+            'Долгий 4': ('55.75', '37.6'),
+            'Нигде': None,
+        })
+
+
+@override_settings(YANDEX_GEO_API_KEY='key', GEOCODER_RATE_LIMIT=1000)
+class GeocodingWorkerTest(TestCase):
+    def fetch(self, apikey, address):
+        self.requested.append(address)
+        if address == 'Нигде':
+            return None
+        if address == 'Таймаут':
+            raise requests.Timeout()
+        return '55.750000', '37.600000'
+
+    def setUp(self):
+        self.requested = []
+        self.worker = GeocodingWorker(fetch=self.fetch)
+
+    def test_geocode(self):
+        Location.objects.create(address='Москва', latitude=55, longitude=37)
+        self.worker.geocode({'Москва', 'Тверская, 1', 'Нигде', 'Таймаут'})
+        self.assertEqual(self.requested, ['Нигде', 'Таймаут', 'Тверская, 1'])
+        self.assertTrue(Location.objects.get(address='Тверская, 1').correct_address)
+        self.assertFalse(Location.objects.get(address='Нигде').correct_address)
+        self.assertFalse(Location.objects.filter(address='Таймаут').exists())
+
+    def test_batch(self):
+        for address in ['Тверская, 1', 'Тверская, 2', 'Тверская, 1']:
+            self.worker.queue.put(address)
+        with override_settings(GEOCODER_BATCH_WAIT=0.01):
+            batch = self.worker.take_batch()
+        self.assertEqual(batch, {'Тверская, 1', 'Тверская, 2'})
+
+    def test_refresh(self):
+        Location.objects.create(address='Москва', latitude=55, longitude=37)
+        self.worker.refresh(['Москва'])
+        self.assertEqual(self.requested, ['Москва'])
+        self.assertEqual(Location.objects.get(address='Москва').latitude, Decimal('55.75'))
+
+    @override_settings(LOCATION_TTL_DAYS=30, LOCATION_NEGATIVE_TTL_DAYS=1)
+    def test_stale_locations(self):
+        now = timezone.now()
+        Location.objects.bulk_create([
+            Location(address='Свежий', updated_at=now - timedelta(days=2)),
+            Location(address='Старый', updated_at=now - timedelta(days=31)),
+            Location(
+                address='Нигде',
+                correct_address=False,
+                updated_at=now - timedelta(days=2),
+            ),
+        ])
+        self.assertEqual(
+            set(get_stale_locations(now).values_list('address', flat=True)),
+            {'Старый', 'Нигде'},
+        )
+
+    @override_settings(YANDEX_GEO_API_KEY=None)
+    def test_no_api_key(self):
+        self.worker.enqueue(['Тверская, 1'])
+        self.assertIsNone(self.worker.thread)
+        self.assertTrue(self.worker.queue.empty())
+
+
+class SaveLocationsTest(TestCase):
+    def test_save(self):
+        Location.objects.create(address='Москва', correct_address=False)
+        saved = []
+
+        def receive(sender, locations, **kwargs):
+            saved.extend(location.address for location in locations)
+
+        locations_saved.connect(receive)
+        self.addCleanup(locations_saved.disconnect, receive)
+        with CaptureQueriesContext(connection) as queries:
+            save_locations({
+                'Москва': ('55.750000', '37.600000'),
+                'Тверская, 1': ('55.760000', '37.610000'),
+                'Нигде': None,
+            })
+        # One read, one insert and one update, whatever the number of rows
+        self.assertEqual(
+            len([
+                query for query in queries
+                if Location._meta.db_table in query['sql']
+            ]),
+            3,
+        )
+        self.assertEqual(sorted(saved), ['Москва', 'Нигде', 'Тверская, 1'])
+        self.assertTrue(Location.objects.get(address='Москва').correct_address)
+        self.assertTrue(Location.objects.get(address='Тверская, 1').correct_address)
+        self.assertFalse(Location.objects.get(address='Нигде').correct_address)
+
+    def test_nothing_to_save(self):
+        with self.assertNumQueries(0):
+            save_locations({})
+
+
+class DistanceMatrixTest(SimpleTestCase):
+    def test_haversine_close_to_geodesic(self):
+        orders = [(55.75, 37.62), (59.94, 30.31)]
+        restaurants = [(55.76, 37.60), (55.70, 37.50), (59.93, 30.36)]
+        haversine = get_haversine_matrix(orders, restaurants)
+        geodesic = get_geodesic_matrix(orders, restaurants)
+        self.assertEqual(haversine.shape, (2, 3))
+        self.assertTrue(np.allclose(haversine, geodesic, rtol=0.005))
+
+    def test_empty(self):
+        self.assertEqual(get_haversine_matrix([], [(55.75, 37.62)]).shape, (0, 1))
+
+
+class GridIndexTest(SimpleTestCase):
+    def setUp(self):
+        generator = random.Random(1)
+        self.points = {
+            key: (55.75 + generator.uniform(-0.5, 0.5), 37.6 + generator.uniform(-1, 1))
+            for key in range(300)
+        }
+        self.index = GridIndex(self.points, cell_km=2)
+
+    def get_nearest(self, point, keys):
+        distances = get_haversine_matrix([point], [self.points[key] for key in keys])[0]
+        return sorted(zip(distances, keys))
+
+    def test_limit_matches_full_scan(self):
+        for point in [(55.75, 37.6), (55.2, 36.5), (60, 30)]:
+            found = self.index.query(point, limit=5)
+            expected = self.get_nearest(point, self.points)[:5]
+            self.assertEqual([key for _, key in found], [key for _, key in expected])
+
+    def test_radius(self):
+        point = (55.75, 37.6)
+        found = self.index.query(point, radius_km=10)
+        expected = [
+            key for distance, key in self.get_nearest(point, self.points)
+            if distance <= 10
+        ]
+        self.assertEqual([key for _, key in found], expected)
+
+    def test_allowed_keys(self):
+        point = (55.75, 37.6)
+        for allowed_keys in [set(range(0, 300, 50)), set(range(0, 300, 3))]:
+            found = self.index.query(point, limit=3, allowed_keys=allowed_keys)
+            expected = self.get_nearest(point, allowed_keys)[:3]
+            self.assertEqual([key for _, key in found], [key for _, key in expected])
+
+    def test_empty(self):
+        self.assertEqual(GridIndex({}, cell_km=2).query((55.75, 37.6), limit=5), [])
@@ -1,3 +1,96 @@
-from django.test import TestCase
+from datetime import timedelta
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from foodcartapp.candidates import refresh_order_candidates
+from foodcartapp.coordinates import apply_locations
+from foodcartapp.models import Order, Restaurant
+from place_coords.models import Location
+
+
+class ViewOrdersTest(TestCase):
+    fixtures = ['dummy.json']
+
+    def setUp(self):
+        cache.clear()
+        refresh_order_candidates(Order.objects.values_list('id', flat=True))
+        addresses = set(Order.objects.values_list('address', flat=True)) | \
+            set(Restaurant.objects.values_list('address', flat=True))
+        apply_locations(Location.objects.bulk_create([
+            Location(address=address, latitude=55.75, longitude=37.6)
+            for address in addresses
+        ]))
+        self.client.force_login(
+            User.objects.create_user('manager', is_staff=True)
+            )
+
+    def test_restaurants_for_orders(self):
+        response = self.client.get(reverse('restaurateur:view_orders'))
+        self.assertEqual(response.status_code, 200)
+        orders = {order.id: order for order in response.context['orders']}
+        self.assertEqual(
+            [restaurant['name'] for restaurant in orders[1].restaurants],
+            ['Star Burger Арбат', 'Star Burger Цветной'],
+        )
+        self.assertEqual(
+            [restaurant['name'] for restaurant in orders[3].restaurants],
+            ['Star Burger Цветной'],
+        )
+
+    @override_settings(NEAREST_RESTAURANTS_LIMIT=1, NEAREST_RESTAURANTS_RADIUS_KM=10)
+    def test_nearest_cutoff(self):
+        Restaurant.objects.filter(name='Star Burger Арбат').\
+            update(latitude=59.94, longitude=30.31)
+        response = self.client.get(reverse('restaurateur:view_orders'))
+        orders = {order.id: order for order in response.context['orders']}
+        self.assertEqual(
+            [restaurant['name'] for restaurant in orders[1].restaurants],
+            ['Star Burger Цветной'],
+        )
+
+    def test_no_location_lookups(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(reverse('restaurateur:view_orders'))
+        self.assertFalse([
+            query for query in queries
+            if Location._meta.db_table in query['sql']
+        ])
+
+    def test_pages(self):
+        Order.objects.filter(pk=2).update(status=Order.Status.DONE)
+        Order.objects.update(created_at=timezone.now())
+        url = reverse('restaurateur:view_orders') + '?limit=2'
+        order_ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertLessEqual(len(response.context['orders']), 2)
+            order_ids += [order.id for order in response.context['orders']]
+            url = response.context['next_page_url']
+        self.assertEqual(order_ids, [1, 3, 4, 5])
+
+    def test_cursor_out_of_range(self):
+        for cursor in ['999999999999999999999999_1', '1_99999999999999999999']:
+            response = self.client.get(
+                reverse('restaurateur:view_orders'), {'cursor': cursor})
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('cursor', response.context['form'].errors)
+            self.assertEqual(response.context['orders'], [])
+
+    def test_filters(self):
+        Order.objects.filter(pk=1).update(status=Order.Status.ASSEMBLING, restaurant=1)
+        Order.objects.filter(pk=5).update(created_at=timezone.now() - timedelta(days=3))
+        response = self.client.get(reverse('restaurateur:view_orders'), {
+            'status': Order.Status.CREATED,
+            'restaurant': 2,
+            'date_from': timezone.localdate() - timedelta(days=1),
+        })
+        self.assertEqual(
+            [order.id for order in response.context['orders']],
+            [2, 3, 4],
+        )
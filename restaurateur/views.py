@@ -1,3 +1,5 @@
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
 from django import forms
 from django.shortcuts import redirect, render
 from django.views import View
@@ -6,15 +8,22 @@ from django.contrib.auth.decorators import user_passes_test
 from django.contrib.auth import authenticate, login
 from django.contrib.auth import views as auth_views
 from django.conf import settings
+from django.db.models import Exists, OuterRef, Q
+from django.utils import timezone
 
-import requests
-from geopy import distance
-from collections import namedtuple
-
-from foodcartapp.models import Product, Restaurant, Order, RestaurantMenuItem
+from foodcartapp.models import Order, OrderCandidate, Product, Restaurant
+from foodcartapp.nearest import get_restaurant_grid_index
+from place_coords.distances import get_distance_matrix
+from place_coords.geocoding import fetch_many_coordinates, save_locations
 from place_coords.models import Location
 
 
+ORDERS_PAGE_DEFAULT_LIMIT = 50
+ORDERS_PAGE_MAX_LIMIT = 200
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+MAX_ORDER_ID = 2 ** 31 - 1
+
+
 class Login(forms.Form):
     username = forms.CharField(
         label='Логин', max_length=75, required=True,
@@ -32,6 +41,60 @@ class Login(forms.Form):
     )
 
 
+class OrdersFilterForm(forms.Form):
+    cursor = forms.RegexField(
+        regex=r'^\d+_\d+$',
+        required=False,
+        widget=forms.HiddenInput
+    )
+    limit = forms.IntegerField(
+        min_value=1,
+        max_value=ORDERS_PAGE_MAX_LIMIT,
+        required=False,
+        widget=forms.HiddenInput
+    )
+    status = forms.TypedChoiceField(
+        label='Статус',
+        choices=[('', 'Все')] + [
+            choice for choice in Order.Status.choices
+            if choice[0] != Order.Status.DONE
+        ],
+        coerce=int,
+        empty_value=None,
+        required=False
+    )
+    payment_method = forms.ChoiceField(
+        label='Оплата',
+        choices=[('', 'Любая')] + Order.PaymentMethod.choices,
+        required=False
+    )
+    restaurant = forms.ModelChoiceField(
+        label='Ресторан',
+        queryset=Restaurant.objects.order_by('name'),
+        empty_label='Любой',
+        required=False
+    )
+    date_from = forms.DateField(
+        label='С',
+        required=False,
+        widget=forms.DateInput(attrs={'type': 'date'})
+    )
+    date_to = forms.DateField(
+        label='По',
+        required=False,
+        widget=forms.DateInput(attrs={'type': 'date'})
+    )
+
+    def clean_cursor(self):
+        cursor = self.cleaned_data['cursor']
+        if not cursor:
+            return None
+        try:
+            return parse_order_cursor(cursor)
+        except (OverflowError, ValueError):
+            raise forms.ValidationError('Неверная ссылка на страницу.')
+
+
 class LoginView(View):
     def get(self, request, *args, **kwargs):
         form = Login()
@@ -97,146 +160,197 @@ def view_restaurants(request):
     })
 
 
-def get_distance(point1, point2):
-    return distance.distance(point1, point2).km
+def fetch_coords(locations, geocoded, address):
+    if address in locations:
+        if locations[address]['correct_address']:
+            lat = locations[address]['latitude']
+            lon = locations[address]['longitude']
+            return lat, lon
+        else:
+            return None
+    return geocoded.get(address)
 
 
-def fetch_coordinates_api(apikey, address):
-    base_url = "https://geocode-maps.yandex.ru/1.x"
-    response = requests.get(base_url, params={
-        "geocode": address,
-        "apikey": apikey,
-        "format": "json",
-    })
-    response.raise_for_status()
-    found_places = response.json()['response']['GeoObjectCollection']['featureMember']
+def get_order_cursor(order):
+    # Integer microseconds, a float timestamp could skip an order
+    # created in the same second
+    timestamp = (order.created_at - EPOCH) // timedelta(microseconds=1)
+    return f'{timestamp}_{order.id}'
 
-    if not found_places:
-        return None
 
-    most_relevant = found_places[0]
-    lon, lat = most_relevant['GeoObject']['Point']['pos'].split(" ")
-    return lat, lon
+def parse_order_cursor(cursor):
+    timestamp, order_id = cursor.split('_')
+    order_id = int(order_id)
+    if order_id > MAX_ORDER_ID:
+        raise ValueError(f'Номер заказа {order_id} вне диапазона')
+    return EPOCH + timedelta(microseconds=int(timestamp)), order_id
 
 
-def find_restaurants_for_order(order, restaurant_menu_items):
-    Restaurant_tuple = namedtuple('Restaurant_tuple', ['name', 'address'])
-    restaurants_for_current_order = set(
-        Restaurant_tuple(item['restaurant__name'], item['restaurant__address'])
-        for item in restaurant_menu_items
-    )
-    for order_item in order.items.all():
-        restauraunts_with_product = set(
-            Restaurant_tuple(
-                item['restaurant__name'],
-                item['restaurant__address']
-                )
-            for item in restaurant_menu_items
-            if item['product_id'] == order_item.product_id
-            )
-        restaurants_for_current_order &= restauraunts_with_product
-    return restaurants_for_current_order
+def get_day_start(day):
+    return timezone.make_aware(datetime.combine(day, time.min))
 
 
-def fetch_coords(locations, address, api_key):
-    if address in locations:
-        if locations[address]['correct_address']:
-            lat = locations[address]['latitude']
-            lon = locations[address]['longitude']
-            return lat, lon
-        else:
-            return None
-    else:
-        try:
-            coords = fetch_coordinates_api(api_key, address)
-        except requests.RequestException:
-            return None
-        if coords is None:
-            Location.objects.get_or_create(
-                correct_address=False,
-                defaults={'address': address}
-            )
-            return None
-        lat, lon = coords
-        Location.objects.get_or_create(
-            latitude=lat,
-            longitude=lon,
-            defaults={'address': address}
+def filter_orders(filters):
+    orders = Order.objects.\
+        exclude(status=Order.Status.DONE).\
+        order_by('created_at', 'id')
+    if filters['cursor']:
+        created_at, order_id = filters['cursor']
+        orders = orders.filter(
+            Q(created_at__gt=created_at)
+            | Q(created_at=created_at, id__gt=order_id)
         )
-        return lat, lon
+    if filters['status'] is not None:
+        orders = orders.filter(status=filters['status'])
+    if filters['payment_method']:
+        orders = orders.filter(payment_method=filters['payment_method'])
+    if filters['restaurant']:
+        candidates = OrderCandidate.objects.filter(
+            order=OuterRef('pk'),
+            restaurant=filters['restaurant'],
+        )
+        orders = orders.filter(
+            Q(restaurant=filters['restaurant']) | Exists(candidates)
+        )
+    if filters['date_from']:
+        orders = orders.filter(created_at__gte=get_day_start(filters['date_from']))
+    if filters['date_to']:
+        orders = orders.filter(
+            created_at__lt=get_day_start(filters['date_to'] + timedelta(days=1))
+            )
+    return orders
 
 
 @user_passes_test(is_manager, login_url='restaurateur:login')
 def view_orders(request):
     api_key = settings.YANDEX_GEO_API_KEY
-    orders = Order.objects.exclude(status=Order.Status.DONE).\
-        annotate_with_total_cost()
-    restaurant_menu_items = RestaurantMenuItem.objects.\
+    form = OrdersFilterForm(request.GET)
+    if form.is_valid():
+        orders = filter_orders(form.cleaned_data)
+        limit = form.cleaned_data['limit'] or ORDERS_PAGE_DEFAULT_LIMIT
+    else:
+        orders = Order.objects.none()
+        limit = ORDERS_PAGE_DEFAULT_LIMIT
+
+    # Only the orders of the page are matched and geocoded
+    orders = orders.\
         select_related('restaurant').\
-        filter(availability=True).\
-        values('restaurant_id',
-               'restaurant__name',
-               'product_id',
-               'restaurant__address'
-               )
-
-    orders_addresses = set(order.address for order in orders)
-    restaurants_addresses = set(restaurant['restaurant__address']
-                                for restaurant in restaurant_menu_items)
-    locations = Location.objects.\
-        filter(address__in=orders_addresses | restaurants_addresses).\
-        values()
-    locations = {location['address']: location for location in locations}
+        prefetch_related('candidates__restaurant')
+    orders = list(orders[:limit + 1])
+    next_page_url = None
+    if len(orders) > limit:
+        orders = orders[:limit]
+        params = request.GET.copy()
+        params['cursor'] = get_order_cursor(orders[-1])
+        next_page_url = f'{request.path}?{params.urlencode()}'
+
+    orders_to_match = [
+        order for order in orders
+        if order.status not in (Order.Status.ASSEMBLING, Order.Status.DELIVERING)
+        and order.candidates.all()
+    ]
+    restaurants = {
+        candidate.restaurant_id: candidate.restaurant
+        for order in orders_to_match
+        for candidate in order.candidates.all()
+    }
+    # Coordinates are read off the rows, only the addresses that were
+    # never geocoded are looked up
+    order_points = {
+        order.id: (order.latitude, order.longitude)
+        for order in orders_to_match
+        if order.latitude is not None
+    }
+    orders_without_coords = [
+        order for order in orders_to_match
+        if order.id not in order_points
+    ]
+    restaurants_without_coords = [
+        restaurant for restaurant in restaurants.values()
+        if restaurant.latitude is None
+    ]
+    addresses_to_resolve = set(order.address for order in orders_without_coords) | \
+        set(restaurant.address for restaurant in restaurants_without_coords)
+    locations = {}
+    if addresses_to_resolve:
+        locations = Location.objects.\
+            filter(address__in=addresses_to_resolve).\
+            values()
+        locations = {location['address']: location for location in locations}
+
+    # All addresses missing on the page are resolved at once, so the page
+    # waits for the slowest lookup rather than for their sum
+    geocoded = {}
+    if api_key:
+        geocoded = fetch_many_coordinates(
+            api_key,
+            addresses_to_resolve - locations.keys()
+            )
+    # Written in one go, which also fills in the rows and the index
+    save_locations(geocoded)
 
+    for order in orders_without_coords:
+        point = fetch_coords(locations, geocoded, order.address)
+        if point is not None:
+            order_points[order.id] = point
+
+    # Only the closest capable restaurants are shown, found through the
+    # grid instead of measuring the distance to every candidate
+    index = get_restaurant_grid_index()
     for order in orders:
         if order.status == Order.Status.ASSEMBLING:
             order.message = f'Готовит {order.restaurant.name}'
         elif order.status == Order.Status.DELIVERING:
             order.message = f'Доставляет {order.restaurant.name}'
+        elif not order.candidates.all():
+            order.message = 'Ни один ресторан не может выполнить заказ'
+        elif order.id not in order_points:
+            order.message = 'Ошибка определения координат'
         else:
-            restaurants_for_current_order = find_restaurants_for_order(
-                order,
-                restaurant_menu_items
+            point = order_points[order.id]
+            candidates = {
+                candidate.restaurant_id: candidate.restaurant
+                for candidate in order.candidates.all()
+            }
+            nearest = index.query(
+                point,
+                limit=settings.NEAREST_RESTAURANTS_LIMIT,
+                radius_km=settings.NEAREST_RESTAURANTS_RADIUS_KM,
+                allowed_keys=candidates.keys(),
+            )
+            if nearest and settings.DISTANCE_GEODESIC:
+                distances = get_distance_matrix(
+                    [point],
+                    [index.points[restaurant_id] for _, restaurant_id in nearest]
+                    )[0]
+                nearest = sorted(
+                    (float(distance), restaurant_id)
+                    for distance, (_, restaurant_id) in zip(distances, nearest)
                 )
-            if restaurants_for_current_order:
-                order_point = fetch_coords(locations, order.address, api_key)
-                if order_point is None:
-                    order.message = 'Ошибка определения координат'
-                    continue
-                restaurants_with_distances = []
-                for restaurant in restaurants_for_current_order:
-                    restaurant_point = fetch_coords(
-                        locations,
-                        restaurant.address,
-                        api_key
-                        )
-                    if restaurant_point is None:
-                        restaurants_with_distances.append(
-                            {
-                                'name': restaurant.name,
-                                'distance': 'Ошибка в адресе ресторана'
-                            }
-                        )
-                    else:
-                        restaurants_with_distances.append(
-                            {
-                                'name': restaurant.name,
-                                'distance': get_distance(
-                                    order_point,
-                                    restaurant_point
-                                    )
-                            }
-                        )   
-                order.restaurants = sorted(
-                    restaurants_with_distances,
-                    key=lambda x: x['distance'])
+            order.restaurants = [
+                {
+                    'name': candidates[restaurant_id].name,
+                    'distance': distance,
+                }
+                for distance, restaurant_id in nearest
+            ] + [
+                {
+                    'name': restaurant.name,
+                    'distance': 'Ошибка в адресе ресторана'
+                }
+                for restaurant_id, restaurant in candidates.items()
+                if restaurant_id not in index.points
+            ]
+            if order.restaurants:
                 order.message = 'Может быть доставлен следующими ресторанами:'
             else:
-                order.message = 'Ни один ресторан не может выполнить заказ'
+                order.message = 'Рядом нет ресторанов, способных выполнить заказ'
     return render(
         request,
         template_name='order_items.html',
         context={
-            'orders': orders
+            'orders': orders,
+            'form': form,
+            'next_page_url': next_page_url,
         }
     )
@@ -90,6 +90,16 @@ DATABASES = {
         conn_health_checks=True,
     )
 }
+CACHES = {
+    'default': env.dj_cache_url('CACHE_URL', 'locmem://'),
+}
+# Each worker has its own cache in memory, so the others see a change
+# only when their copies of the cached versions expire
+LOCAL_CACHE = CACHES['default']['BACKEND'] == \
+    'django.core.cache.backends.locmem.LocMemCache'
+LOCAL_CACHE_TIMEOUT = env.int('LOCAL_CACHE_TIMEOUT', 60)
+CACHE_VERSION_TIMEOUT = LOCAL_CACHE_TIMEOUT if LOCAL_CACHE else None
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -129,6 +139,42 @@ STATICFILES_DIRS = [
 
 PHONENUMBER_DEFAULT_REGION = 'RU'
 YANDEX_GEO_API_KEY = env('YANDEX_GEO_API_KEY', None)
+NEAREST_RESTAURANTS_LIMIT = env.int('NEAREST_RESTAURANTS_LIMIT', 5)
+NEAREST_RESTAURANTS_RADIUS_KM = env.float('NEAREST_RESTAURANTS_RADIUS_KM', 30)
+NEAREST_RESTAURANTS_GRID_CELL_KM = 2
+DISTANCE_GEODESIC = env.bool('DISTANCE_GEODESIC', False)
+GEOCODER_URL = 'https://geocode-maps.yandex.ru/1.x'
+GEOCODER_CONCURRENCY = env.int('GEOCODER_CONCURRENCY', 8)
+GEOCODER_CONNECT_TIMEOUT = 3
+GEOCODER_READ_TIMEOUT = 5
+GEOCODER_RATE_LIMIT = env.float('GEOCODER_RATE_LIMIT', 5)
+GEOCODER_BATCH_SIZE = 20
+GEOCODER_BATCH_WAIT = 1
+GEOCODER_QUEUE_SIZE = 1000
+LOCATION_TTL_DAYS = env.int('LOCATION_TTL_DAYS', 30)
+LOCATION_NEGATIVE_TTL_DAYS = env.int('LOCATION_NEGATIVE_TTL_DAYS', 1)
+
+CATALOG_SNAPSHOT_TIMEOUT = env.int(
+    'CATALOG_SNAPSHOT_TIMEOUT',
+    LOCAL_CACHE_TIMEOUT if LOCAL_CACHE else 24 * 60 * 60
+)
+CATALOG_STREAMING = env.bool('CATALOG_STREAMING', False)
+CATALOG_STREAM_CHUNK_SIZE = env.int('CATALOG_STREAM_CHUNK_SIZE', 500)
+CATALOG_TOMBSTONE_RETENTION_DAYS = env.int('CATALOG_TOMBSTONE_RETENTION_DAYS', 7)
+CATALOG_CHANGES_SAFETY_LAG = env.int('CATALOG_CHANGES_SAFETY_LAG', 5)
+BULK_ORDERS_MAX_BATCH = env.int('BULK_ORDERS_MAX_BATCH', 1000)
+ORDER_INTAKE_ASYNC = env.bool('ORDER_INTAKE_ASYNC', False)
+ORDER_JOURNAL_PATH = env(
+    'ORDER_JOURNAL_PATH',
+    os.path.join(BASE_DIR, 'order_journal.sqlite3')
+)
+ORDER_JOURNAL_RETENTION_DAYS = env.int('ORDER_JOURNAL_RETENTION_DAYS', 7)
+ORDER_FAST_VALIDATION = env.bool('ORDER_FAST_VALIDATION', False)
+IDEMPOTENCY_KEY_TTL = env.int('IDEMPOTENCY_KEY_TTL', 24 * 60 * 60)
+IDEMPOTENCY_LOCK_TIMEOUT = 30
+IDEMPOTENCY_WAIT_TIMEOUT = 10
+BANNERS_CACHE_TIMEOUT = env.int('BANNERS_CACHE_TIMEOUT', 24 * 60 * 60)
+BANNERS_MAX_AGE = env.int('BANNERS_MAX_AGE', 5 * 60)
 
 ROLLBAR = {
     'access_token': env('ROLLBAR_TOKEN', ''),